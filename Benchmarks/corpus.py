@@ -0,0 +1,277 @@
+# synthetic documents for the benchmarks
+# every generator is deterministic and repeats its unit until the text reaches the requested size
+import random
+
+WORDS = [
+    "panda", "surf", "browser", "layout", "style", "paint", "the", "quick", "brown",
+    "fox", "jumps", "over", "lazy", "dog", "render", "cascade", "selector", "inline",
+]
+COLORS = ["red", "blue", "black", "white", "gray", "orange", "purple", "lightblue"]
+TAGS = ["div", "p", "span", "a", "b", "i", "li", "ul", "section", "article", "nav", "h1", "h2"]
+
+
+def repeat_until(size, header, unit, footer=""):
+    rng = random.Random(size)
+    parts = [header]
+    length = len(header) + len(footer)
+    i = 0
+    while length < size:
+        part = unit(rng, i)
+        parts.append(part)
+        length += len(part)
+        i += 1
+    parts.append(footer)
+    return "".join(parts)
+
+
+def sentence(rng, count):
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+def text_document(size):
+    # article-like page: paragraphs with inline tags and links
+    def unit(rng, i):
+        return '<div class="section" id="s{}"><p>{} <b>{}</b> <a href="/wiki/{}">{}</a> {}</p></div>\n'.format(
+            i, sentence(rng, 40), sentence(rng, 3), i, sentence(rng, 2), sentence(rng, 20))
+    return repeat_until(size, "<!DOCTYPE html><html><head><title>Text</title></head><body>", unit,
+                        "</body></html>")
+
+
+def deep_document(size, depth=200):
+    # chains of nested elements
+    def unit(rng, i):
+        tags = [rng.choice(TAGS) for _ in range(depth)]
+        return "".join("<" + tag + ">" for tag in tags) + sentence(rng, 5) + \
+            "".join("</" + tag + ">" for tag in reversed(tags)) + "\n"
+    return repeat_until(size, "<html><body>", unit, "</body></html>")
+
+
+def attributes_document(size):
+    # elements carrying many quoted and bare attributes
+    def unit(rng, i):
+        attributes = " ".join('data-{}="{}"'.format(j, sentence(rng, 1)) for j in range(12))
+        return '<input id="i{}" class="field wide" name="n{}" value="{}" {} disabled>\n'.format(
+            i, i, sentence(rng, 1), attributes)
+    return repeat_until(size, "<html><body><form action=\"/submit\">", unit, "</form></body></html>")
+
+
+def script_document(size):
+    # big script blocks full of "<", ">" and quotes
+    def unit(rng, i):
+        lines = []
+        for j in range(40):
+            lines.append('    if (a{} < {} && b > "{}") {{ log("<p>" + x{}); }}'.format(j, j, sentence(rng, 1), j))
+        return "<script>\nfunction f{}() {{\n{}\n}}\n</script>\n<p>{}</p>\n".format(
+            i, "\n".join(lines), sentence(rng, 10))
+    return repeat_until(size, "<html><head><title>Scripts</title></head><body>", unit, "</body></html>")
+
+
+def comment_document(size):
+    # text interleaved with comments, some containing markup
+    def unit(rng, i):
+        return "<p>{}</p><!-- {} <div class=\"hidden\"> {} --><!---->\n".format(
+            sentence(rng, 10), sentence(rng, 8), sentence(rng, 8))
+    return repeat_until(size, "<html><body>", unit, "</body></html>")
+
+
+def entity_document(size):
+    # text dense with character references
+    entities = ["&amp;", "&lt;", "&gt;", "&quot;", "&shy;"]
+
+    def unit(rng, i):
+        words = [rng.choice(WORDS) + rng.choice(entities) for _ in range(30)]
+        return "<p>" + " ".join(words) + "</p>\n"
+    return repeat_until(size, "<html><body>", unit, "</body></html>")
+
+
+def stylesheet(size):
+    # real-world looking css: descendant and class selectors, comments, at-rules and quoted strings
+    def unit(rng, i):
+        tag = rng.choice(TAGS)
+        rule = "{} .c{} {{ color: {}; font-size: {}px; background-color: {}; }}\n".format(
+            tag, i, rng.choice(COLORS), rng.randint(8, 40), rng.choice(COLORS))
+        if i % 10 == 0:
+            rule += "/* section {} */\n".format(i)
+        if i % 25 == 0:
+            rule += '@media screen and (max-width: {}px) {{ {} {{ display: block; }} }}\n'.format(
+                rng.randint(300, 1200), tag)
+        if i % 40 == 0:
+            rule += '{}, .alt{} {{ font-family: "Courier New"; }}\n'.format(tag, i)
+        return rule
+    return repeat_until(size, "", unit)
+
+
+def framework_stylesheet(size):
+    # minified framework css: long declaration blocks, selector lists, pseudo-classes, prefixed
+    # properties, functional values, nested at-rules and url() strings
+    def unit(rng, i):
+        tag = rng.choice(TAGS)
+        color = rng.choice(COLORS)
+        rules = [
+            ".btn-{0},.btn-{0}:hover,{1} .btn-{0}{{display:inline-block;padding:.375rem .75rem;"
+            "font-size:1rem;line-height:1.5;color:{2};background-color:{3};border:1px solid transparent;"
+            "border-radius:.25rem;-webkit-transition:color .15s ease-in-out,background-color .15s;"
+            "transition:color .15s ease-in-out,background-color .15s;box-shadow:0 0 0 .2rem rgba(0,123,255,.5)}}".format(
+                i, tag, color, rng.choice(COLORS)),
+            "{0} .col-{1}{{-ms-flex:0 0 {2}%;flex:0 0 {2}%;max-width:{2}%;position:relative;width:100%;"
+            "padding-right:15px;padding-left:15px;margin:0 auto!important}}".format(tag, i, rng.randint(1, 100)),
+            "{0}>li.nav-{1}::before{{content:\"\\2014 \\00A0\";color:{2}}}".format(tag, i, color),
+            "{0} {1}{{color:{2};font-family:-apple-system,\"Segoe UI\",Roboto,sans-serif;font-weight:400}}".format(
+                tag, rng.choice(TAGS), color),
+        ]
+        if i % 10 == 0:
+            rules.append("@media (min-width:{0}px){{.container-{1}{{max-width:{0}px}}{2} .row-{1}{{display:flex}}}}".format(
+                rng.randint(300, 1200), i, tag))
+        if i % 40 == 0:
+            rules.append("@font-face{{font-family:\"Font {0}\";src:url(\"fonts/f{0}.woff2\") format(\"woff2\")}}"
+                         "@keyframes spin-{0}{{from{{transform:rotate(0)}}to{{transform:rotate(360deg)}}}}".format(i))
+        return "".join(rules)
+    return repeat_until(size, "", unit)
+
+
+def rule_sheet(count):
+    # count rules over a shared pool of classes: tags, classes, and descendant selectors ending in either
+    rng = random.Random(count)
+    classes = max(count // 10, 1)
+    rules = []
+    for i in range(count):
+        kind = i % 4
+        tag, other = rng.choice(TAGS), rng.choice(TAGS)
+        cls = "c{}".format(rng.randrange(classes))
+        if kind == 0:
+            selector = tag
+        elif kind == 1:
+            selector = "{} .{}".format(tag, cls)
+        elif kind == 2:
+            selector = "{} {}".format(tag, other)
+        else:
+            selector = "{} {} .{}".format(other, tag, cls)
+        rules.append("{} {{ color: {}; font-size: {}px; }}\n".format(
+            selector, rng.choice(COLORS), rng.randint(8, 40)))
+    return "".join(rules), classes
+
+
+def styled_document(count, classes):
+    # about count elements and text nodes, nested a few levels deep, using the classes of rule_sheet
+    rng = random.Random(count)
+    parts = ["<html><body>"]
+    nodes = 2
+    while nodes < count:
+        tags = [rng.choice(TAGS) for _ in range(rng.randint(1, 6))]
+        for tag in tags:
+            parts.append('<{} class="c{}">'.format(tag, rng.randrange(classes)))
+        parts.append(sentence(rng, 3))
+        parts.extend("</" + tag + ">" for tag in reversed(tags))
+        nodes += len(tags) + 1
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def nested_document(count, classes, depth):
+    # chains of depth wrapper divs, a few of them with classes, around one element of text
+    # like the deep trees page frameworks produce, using the classes of rule_sheet
+    rng = random.Random(count)
+    parts = ["<html><body>"]
+    nodes = 2
+    while nodes < count:
+        for _ in range(depth):
+            if rng.random() < 0.1:
+                parts.append('<div class="c{}">'.format(rng.randrange(classes)))
+            else:
+                parts.append("<div>")
+        tag = rng.choice(TAGS)
+        parts.append("<{}>{}</{}>".format(tag, sentence(rng, 3), tag))
+        parts.append("</div>" * depth)
+        nodes += depth + 2
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def list_document(count):
+    # long menus, lists and tables of rows that only differ in their text
+    rng = random.Random(count)
+    parts = ["<html><body>"]
+    nodes = 2
+    while nodes < count:
+        parts.append('<ul class="menu">')
+        for _ in range(50):
+            parts.append('<li class="item"><a href="/">{}</a></li>'.format(sentence(rng, 2)))
+        parts.append("</ul><table>")
+        for i in range(50):
+            parts.append('<tr class="{}"><td>{}</td><td><b>{}</b></td></tr>'.format(
+                "odd" if i % 2 else "even", sentence(rng, 3), rng.randint(0, 1000)))
+        parts.append("</table>")
+        for _ in range(20):
+            parts.append("<p>{}</p>".format(sentence(rng, 12)))
+        nodes += 1 + 50 * 3 + 1 + 50 * 6 + 20 * 2
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def wide_document(size):
+    # one long run of sibling blocks under body
+    def unit(rng, i):
+        return "<div>{}</div>".format(sentence(rng, 2))
+    return repeat_until(size, "<html><body>", unit, "</body></html>")
+
+
+def form_document(size):
+    # forms full of labelled inputs and buttons
+    def unit(rng, i):
+        fields = "".join('<p>{} <input name="f{}" value="{}"></p>'.format(sentence(rng, 2), j, rng.choice(WORDS))
+                         for j in range(rng.randint(2, 6)))
+        return '<form action="/submit">{}<button>{}</button></form>\n'.format(fields, sentence(rng, 1))
+    return repeat_until(size, "<html><body>", unit, "</body></html>")
+
+
+def effects_document(size):
+    # blocks with opacity, blend modes and clipped rounded corners, the ones opacity puts in their own layer
+    def unit(rng, i):
+        effect = rng.choice([
+            "opacity:0.{}".format(rng.randint(1, 9)),
+            "mix-blend-mode:{}".format(rng.choice(["multiply", "difference"])),
+            "border-radius:{}px;overflow:clip".format(rng.randint(1, 20)),
+            "background-color:{}".format(rng.choice(COLORS)),
+        ])
+        return '<div style="{}"><p>{}</p></div>\n'.format(effect, sentence(rng, 8))
+    return repeat_until(size, "<html><body>", unit, "</body></html>")
+
+
+def attribute_strings(size):
+    # the text between "<" and ">" that get_attributes receives
+    def unit(rng, i):
+        attributes = " ".join('data-{}="{}"'.format(j, rng.choice(WORDS)) for j in range(rng.randint(0, 10)))
+        return '{} id=x{} class="{}" {}'.format(rng.choice(TAGS).upper(), i, rng.choice(WORDS), attributes)
+
+    rng = random.Random(size)
+    strings = []
+    length = 0
+    while length < size:
+        text = unit(rng, len(strings))
+        strings.append(text)
+        length += len(text)
+    return strings
+
+
+HTML_CORPORA = {
+    "text": text_document,
+    "deep": deep_document,
+    "attributes": attributes_document,
+    "scripts": script_document,
+    "comments": comment_document,
+    "entities": entity_document,
+}
+
+CSS_CORPORA = {
+    "stylesheet": stylesheet,
+    "framework": framework_stylesheet,
+}
+
+# pages for the render pipeline benchmark
+PAGE_CORPORA = {
+    "text": text_document,
+    "deep": deep_document,
+    "wide": wide_document,
+    "forms": form_document,
+    "effects": effects_document,
+}
@@ -0,0 +1,98 @@
+# reports how many bytes the parsed DOM takes per node, and how many the same tree takes
+# built from dict-backed nodes like the ones before __slots__, with the difference
+# run from the repository root: python -m Benchmarks.dom_memory [paragraphs] [--no-baseline]
+import argparse
+import gc
+import tracemalloc
+
+from HTMLParser import HTMLParser
+from Helper.tokens import Element, NO_ATTRIBUTES
+from Helper.traversal import tree_to_list
+
+
+class DictText:
+    # a text node as it was before __slots__, with its own children list, style and animations
+    def __init__(self, text, parent):
+        self.text = text
+        self.children = []
+        self.parent = parent
+
+        self.style = {}
+        self.animations = {}
+
+
+class DictElement:
+    def __init__(self, tag, attributes, parent):
+        self.tag = tag
+        self.attributes = attributes
+        self.children = []
+        self.parent = parent
+
+        self.style = {}
+        self.animations = {}
+
+
+def make_document(paragraphs):
+    parts = ["<!DOCTYPE html><html><head><title>Memory</title></head><body>"]
+    for i in range(paragraphs):
+        parts.append('<div class="section" id="s{}"><p>Paragraph {} with <b>bold</b> and '.format(i, i))
+        parts.append('<a href="/page/{}">a link</a> text.<br></p><ul><li>one</li><li>two</li></ul></div>\n'.format(i))
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def dict_nodes(tree):
+    # the same tree with dict-backed nodes; strings and attribute dicts move over to the new nodes,
+    # and every node gets the containers it had before the shared placeholders
+    def copy(node, parent):
+        if isinstance(node, Element):
+            attributes = {} if node.attributes is NO_ATTRIBUTES else node.attributes
+            return DictElement(node.tag, attributes, parent)
+        return DictText(node.text, parent)
+
+    root = copy(tree, None)
+    stack = [(tree, root)]
+    while stack:
+        node, new_node = stack.pop()
+        for child in node.children:
+            new_child = copy(child, new_node)
+            new_node.children.append(new_child)
+            stack.append((child, new_child))
+    return root
+
+
+def measure(body, baseline=False):
+    # the bytes still allocated once the page is parsed, with dict-backed nodes for the baseline
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tree = HTMLParser(body).parse()
+    if baseline:
+        tree = dict_nodes(tree)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    nodes = len(tree_to_list(tree, []))
+    return nodes, after - before
+
+
+def report(label, nodes, size):
+    print("{}: {:.1f} MB, {:.0f} bytes per node".format(label, size / 1e6, size / nodes))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="DOM memory benchmark")
+    parser.add_argument("paragraphs", type=int, nargs="?", default=10000)
+    parser.add_argument("--no-baseline", action="store_true", help="skip the dict-backed nodes")
+    args = parser.parse_args()
+    body = make_document(args.paragraphs)
+    nodes, size = measure(body)
+    print("nodes: {}".format(nodes))
+    report("DOM size", nodes, size)
+    if not args.no_baseline:
+        baseline_nodes, baseline_size = measure(body, baseline=True)
+        assert baseline_nodes == nodes
+        report("dict-backed DOM size", nodes, baseline_size)
+        saved = baseline_size - size
+        print("saved: {:.1f} MB, {:.0f} bytes per node ({:.0f}%)".format(
+            saved / 1e6, saved / nodes, saved / baseline_size * 100))
@@ -0,0 +1,168 @@
+# parse throughput, node counts, peak memory and scaling of HTMLParser, CSSParser and get_attributes
+# runs offline on the synthetic corpora and prints machine-readable JSON
+# run from the repository root: python -m Benchmarks.parsers [--sizes 10000 100000 ...] [--baseline old.json]
+# to compare two versions, save a report of the old one with --output and pass it to the new one as --baseline
+import argparse
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+
+from Benchmarks.corpus import HTML_CORPORA, CSS_CORPORA, attribute_strings
+from CSSParser import CSSParser
+from HTMLParser import HTMLParser, get_attributes
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+
+def count_nodes(tree):
+    count = 0
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
+    return count
+
+
+def best_time(run, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def peak_memory(run):
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def scaling_exponent(runs):
+    # slope of log(time) against log(size): 1.0 is linear
+    points = [(math.log(run["bytes"]), math.log(run["seconds"]))
+              for run in runs if run["seconds"] > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    num = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    den = sum((x - mean_x) ** 2 for x, _ in points)
+    return round(num / den, 3) if den else None
+
+
+def measure(size, run, count, repeat, with_memory):
+    seconds, result = best_time(run, repeat)
+    entry = {
+        "bytes": size,
+        "seconds": round(seconds, 6),
+        "mb_per_s": round(size / 1e6 / seconds, 3) if seconds else None,
+        "count": count(result),
+    }
+    if with_memory:
+        entry["peak_bytes"] = peak_memory(run)
+    return entry
+
+
+def bench_html(sizes, repeat, with_memory):
+    report = {}
+    for name, generate in HTML_CORPORA.items():
+        runs = []
+        for size in sizes:
+            body = generate(size)
+            runs.append(measure(len(body), lambda: HTMLParser(body).parse(),
+                                count_nodes, repeat, with_memory))
+        report[name] = {"count": "nodes", "runs": runs, "scaling_exponent": scaling_exponent(runs)}
+    return report
+
+
+def bench_css(sizes, repeat, with_memory):
+    report = {}
+    for name, generate in CSS_CORPORA.items():
+        runs = []
+        for size in sizes:
+            text = generate(size)
+            runs.append(measure(len(text), lambda: CSSParser(text).parse(), len, repeat, with_memory))
+        report[name] = {"count": "rules", "runs": runs, "scaling_exponent": scaling_exponent(runs)}
+    return report
+
+
+def bench_attributes(sizes, repeat, with_memory):
+    runs = []
+    for size in sizes:
+        strings = attribute_strings(size)
+        total = sum(len(text) for text in strings)
+        runs.append(measure(total, lambda: [get_attributes(text) for text in strings],
+                            len, repeat, with_memory))
+    return {"get_attributes": {"count": "tags", "runs": runs, "scaling_exponent": scaling_exponent(runs)}}
+
+
+def compare(report, baseline):
+    # throughput of every run against the same run in the baseline report
+    found = []
+    for section in ["html", "css", "attributes"]:
+        for name, result in report[section].items():
+            old = baseline.get(section, {}).get(name)
+            if not old:
+                continue
+            old_runs = {run["bytes"]: run for run in old["runs"]}
+            for run in result["runs"]:
+                old_run = old_runs.get(run["bytes"])
+                if not old_run or not old_run["mb_per_s"] or not run["mb_per_s"]:
+                    continue
+                found.append({"benchmark": section + "/" + name, "bytes": run["bytes"],
+                              "mb_per_s": run["mb_per_s"], "baseline_mb_per_s": old_run["mb_per_s"],
+                              "speedup": round(run["mb_per_s"] / old_run["mb_per_s"], 2)})
+    return found
+
+
+def regressions(comparison, tolerance):
+    # runs whose throughput fell more than tolerance below the baseline
+    return [entry for entry in comparison if entry["speedup"] < 1 - tolerance]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parser throughput benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="corpus sizes in bytes")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size, the best one is reported")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak memory run")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare throughput against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed throughput drop against the baseline, as a fraction")
+    args = parser.parse_args()
+    with_memory = not args.no_memory
+    report = {
+        "python": platform.python_version(),
+        "sizes": args.sizes,
+        "html": bench_html(args.sizes, args.repeat, with_memory),
+        "css": bench_css(args.sizes, args.repeat, with_memory),
+        "attributes": bench_attributes(args.sizes, args.repeat, with_memory),
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["comparison"] = compare(report, json.load(f))
+        report["regressions"] = regressions(report["comparison"], args.tolerance)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    # a non-zero exit status lets scripts stop on a regression
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+# time, allocations and scaling of every render stage, from style to draw, without opening a window
+# drives a real Tab through style, layout and paint, and the browser's composite, raster and draw code
+# on CPU surfaces, for each page corpus at each size, and prints machine-readable JSON
+# run from the repository root: python -m Benchmarks.pipeline [--sizes 20000 100000 ...] [--baseline old.json]
+# to check an upgrade, save a report of the old version with --output and pass it to the new one as --baseline;
+# the exit status is non-zero if a stage got slower than --tolerance allows or scales worse than --max-exponent
+import argparse
+import json
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+
+import skia
+
+from Benchmarks.corpus import PAGE_CORPORA
+from Benchmarks.parsers import scaling_exponent, regressions
+from HTMLParser import HTMLParser
+from Helper.rule_index import RuleIndex
+from Helper.traversal import walk
+from browser import Browser
+from tab import Tab
+
+DEFAULT_SIZES = [20_000, 100_000, 500_000]
+STAGES = ["style", "layout", "paint", "composite", "raster", "draw"]
+
+
+class HeadlessBrowser(Browser):
+    # the browser's compositing and drawing code with CPU surfaces instead of a window
+    def __init__(self):
+        self.single_threaded = True
+        self.lock = threading.Lock()
+        self.tabs = []
+        self.active_tab = 0
+        self.needs_animation_frame = False
+        self.skia_context = None
+        self.scroll = 0
+        self.active_tab_height = 0
+        self.active_tab_document_height = 0
+        self.active_tab_display_list = []
+        self.composited_layers = []
+        self.composited_updates = {}
+        self.draw_list = []
+        self.surface = skia.Surface(self.WIDTH, self.HEIGHT)
+
+    def set_needs_animation_frame(self, tab):
+        pass
+
+    def raster_tab(self):
+        # CPU surfaces, since there is no GPU context to make render targets with
+        for layer in self.composited_layers:
+            if not layer.surface:
+                bounds = layer.composited_bounds()
+                if not bounds.isEmpty():
+                    irect = bounds.roundOut()
+                    layer.surface = skia.Surface(irect.width(), irect.height())
+            layer.raster()
+
+    def draw_tab(self):
+        self.paint_draw_list()
+        canvas = self.surface.getCanvas()
+        canvas.clear(skia.ColorWHITE)
+        canvas.save()
+        canvas.translate(0, self.CHROME_PX - self.scroll)
+        for item in self.draw_list:
+            item.execute(canvas)
+        canvas.restore()
+
+
+def stage_runs(browser, body):
+    # every stage of one page render, in order, as (name, function) pairs
+    tab = Tab(browser, [])
+    browser.tabs = [tab]
+
+    def load():
+        tab.nodes = HTMLParser(body).parse()
+        tab.rules = RuleIndex(tab.default_style_sheet)
+        tab.needs_style = True
+
+    def layout():
+        # the whole page, not only the part the tab lays out for the first frame, so the stage
+        # and everything after it scale with the page like they did before layout was lazy
+        tab.render_layout()
+        tab.document.layout_more()
+
+    def commit():
+        tab.render_paint()
+        browser.active_tab_display_list = tab.display_list
+
+    return tab, load, [
+        ("style", tab.render_style),
+        ("layout", layout),
+        ("paint", commit),
+        ("composite", browser.composite),
+        ("raster", browser.raster_tab),
+        ("draw", browser.draw_tab),
+    ]
+
+
+def time_stages(body, repeat):
+    # best time of every stage over repeat fresh renders of the page
+    best = {}
+    for _ in range(repeat):
+        browser = HeadlessBrowser()
+        tab, load, stages = stage_runs(browser, body)
+        load()
+        for name, run in stages:
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            if name not in best or elapsed < best[name]:
+                best[name] = elapsed
+    counts = {
+        "nodes": sum(1 for _ in walk(tab.nodes)),
+        "layout_objects": sum(1 for _ in walk(tab.document)),
+        "display_items": sum(1 for item in tab.display_list for _ in walk(item)),
+        "layers": len(browser.composited_layers),
+    }
+    return best, counts
+
+
+def stage_memory(body):
+    # peak and retained bytes allocated by every stage of one render
+    browser = HeadlessBrowser()
+    tab, load, stages = stage_runs(browser, body)
+    load()
+    memory = {}
+    tracemalloc.start()
+    for name, run in stages:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        run()
+        after, peak = tracemalloc.get_traced_memory()
+        memory[name] = {"peak_bytes": peak - before, "retained_bytes": after - before}
+    tracemalloc.stop()
+    return memory
+
+
+def bench_pages(sizes, repeat, with_memory):
+    report = {}
+    for name, generate in PAGE_CORPORA.items():
+        runs = []
+        for size in sizes:
+            body = generate(size)
+            seconds, counts = time_stages(body, repeat)
+            stages = {stage: {"seconds": round(seconds[stage], 6)} for stage in STAGES}
+            if with_memory:
+                for stage, memory in stage_memory(body).items():
+                    stages[stage].update(memory)
+            run = {"bytes": len(body)}
+            run.update(counts)
+            run["total_seconds"] = round(sum(seconds.values()), 6)
+            run["stages"] = stages
+            runs.append(run)
+        report[name] = {
+            "runs": runs,
+            "scaling_exponents": {
+                stage: scaling_exponent([{"bytes": run["bytes"], "seconds": run["stages"][stage]["seconds"]}
+                                         for run in runs])
+                for stage in STAGES
+            },
+        }
+    return report
+
+
+def compare(report, baseline):
+    # speed of every stage of every run against the same run in the baseline report
+    found = []
+    for name, result in report["pages"].items():
+        old = baseline.get("pages", {}).get(name)
+        if not old:
+            continue
+        old_runs = {run["bytes"]: run for run in old["runs"]}
+        for run in result["runs"]:
+            old_run = old_runs.get(run["bytes"])
+            if not old_run:
+                continue
+            for stage in STAGES:
+                seconds = run["stages"][stage]["seconds"]
+                old_seconds = old_run["stages"].get(stage, {}).get("seconds")
+                if not seconds or not old_seconds:
+                    continue
+                found.append({"benchmark": name + "/" + stage, "bytes": run["bytes"],
+                              "seconds": seconds, "baseline_seconds": old_seconds,
+                              "speedup": round(old_seconds / seconds, 2)})
+    return found
+
+
+def steep_scaling(report, max_exponent):
+    # stages whose time grows faster with page size than max_exponent allows
+    return [{"benchmark": name + "/" + stage, "scaling_exponent": exponent}
+            for name, result in report["pages"].items()
+            for stage, exponent in result["scaling_exponents"].items()
+            if exponent is not None and exponent > max_exponent]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render pipeline benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="page sizes in bytes")
+    parser.add_argument("--repeat", type=int, default=3, help="renders per size, the best one is reported")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc allocation run")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare stage times against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed speed drop of a stage against the baseline, as a fraction")
+    parser.add_argument("--max-exponent", type=float, help="largest allowed scaling exponent of any stage")
+    args = parser.parse_args()
+    report = {
+        "python": platform.python_version(),
+        "sizes": args.sizes,
+        "pages": bench_pages(args.sizes, args.repeat, not args.no_memory),
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["comparison"] = compare(report, json.load(f))
+        report["regressions"] = regressions(report["comparison"], args.tolerance)
+    if args.max_exponent is not None:
+        report["steep_scaling"] = steep_scaling(report, args.max_exponent)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    # a non-zero exit status lets scripts stop on a regression
+    if report.get("regressions") or report.get("steep_scaling"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# selector matches per second with the compiled matches closures and with the generic matches methods
+# every node is tested against the rules the rule index offers it, like style() does
+# run from the repository root: python -m Benchmarks.selector_matching [--rules 5000] [--nodes 20000] [--repeat 3]
+import argparse
+import json
+import platform
+import time
+
+from Benchmarks.corpus import rule_sheet, styled_document, nested_document
+from CSSParser import CSSParser
+from HTMLParser import HTMLParser
+from Helper.rule_index import RuleIndex
+from Helper.selector import DescendantSelector
+from Helper.traversal import tree_to_list
+
+
+def uncompiled(selector):
+    # a copy of selector that matches through the class's matches method, like before compilation
+    copy = object.__new__(type(selector))
+    copy.__dict__.update(selector.__dict__)
+    del copy.matches
+    if isinstance(selector, DescendantSelector):
+        copy.base_selectors = tuple(uncompiled(base) for base in selector.base_selectors)
+    return copy
+
+
+def pairs(index, body):
+    nodes = tree_to_list(HTMLParser(body).parse(), [])
+    return [(selector, node) for node in nodes for selector, _ in index.candidates(node)]
+
+
+def time_matches(pairs, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        matched = 0
+        for selector, node in pairs:
+            if selector.matches(node):
+                matched += 1
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, matched
+
+
+def compare(compiled_pairs, repeat):
+    generic_pairs = []
+    copies = {}
+    for selector, node in compiled_pairs:
+        copy = copies.get(id(selector))
+        if copy is None:
+            copy = copies[id(selector)] = uncompiled(selector)
+        generic_pairs.append((copy, node))
+    report = {}
+    for name, run_pairs in [("compiled", compiled_pairs), ("generic", generic_pairs)]:
+        seconds, matched = time_matches(run_pairs, repeat)
+        report[name] = {
+            "matches": len(run_pairs),
+            "matched": matched,
+            "seconds": round(seconds, 6),
+            "matches_per_second": round(len(run_pairs) / seconds),
+        }
+    report["speedup"] = round(report["compiled"]["matches_per_second"] / report["generic"]["matches_per_second"], 2)
+    return report
+
+
+def run(rule_count, node_count, repeat):
+    text, classes = rule_sheet(rule_count)
+    index = RuleIndex(CSSParser(text).parse())
+    report = {"python": platform.python_version(), "rules": len(index)}
+    for name, body in [("shallow", styled_document(node_count, classes)),
+                       ("deep", nested_document(node_count, classes, 200))]:
+        all_pairs = pairs(index, body)
+        report[name] = {
+            "all": compare(all_pairs, repeat),
+            "descendant": compare([pair for pair in all_pairs if isinstance(pair[0], DescendantSelector)], repeat),
+            "simple": compare([pair for pair in all_pairs if not isinstance(pair[0], DescendantSelector)], repeat),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Selector matching benchmark")
+    parser.add_argument("--rules", type=int, default=5000, help="rules in the style sheet")
+    parser.add_argument("--nodes", type=int, default=20000, help="nodes in each document")
+    parser.add_argument("--repeat", type=int, default=3, help="runs, the best one is reported")
+    args = parser.parse_args()
+    print(json.dumps(run(args.rules, args.nodes, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# style time and per-node candidate rule counts, with the rule index and with every rule tested on every node
+# the unindexed run is slow, so it styles a smaller document and its total is extrapolated per node
+# both documents are also styled without the ancestor filter, the second one nested depth deep,
+# and a list-heavy document with and without style sharing, and restyled after a style attribute
+# change on a few of its nodes, incrementally and with a full style pass
+# run from the repository root: python -m Benchmarks.style [--rules 5000] [--nodes 50000] [--linear-nodes 2000]
+#                                                          [--depth 200]
+import argparse
+import json
+import platform
+import sys
+import time
+
+from Benchmarks.corpus import rule_sheet, styled_document, nested_document, list_document
+from CSSParser import CSSParser
+from HTMLParser import HTMLParser
+from Helper.ancestor_filter import AncestorFilter
+from Helper.rule_index import RuleIndex
+from Helper.style import style, restyle
+from Helper.style_sharing import StyleSharing
+from Helper.tokens import Element, DIRTY_SELF
+from Helper.traversal import tree_to_list
+from tab import cascade_priority
+
+
+class AllRules:
+    # every rule is a candidate for every node, like style() before the rule index
+    def __init__(self, rules):
+        self.rules = rules
+
+    def candidates(self, node):
+        return self.rules
+
+
+class NoAncestorFilter(AncestorFilter):
+    # lets every descendant selector through to matches(), like style() before the ancestor filter
+    def __init__(self):
+        super().__init__()
+        # every slot looks occupied
+        self.bits = -1
+
+    def start(self, node):
+        pass
+
+    def push(self, node):
+        pass
+
+    def pop(self, node):
+        pass
+
+
+class NoStyleSharing(StyleSharing):
+    # computes and keeps every node's style, like style() before style sharing
+    def get(self, key):
+        self.lookups += 1
+        return None
+
+    def intern(self, style):
+        return style
+
+
+def candidate_counts(rules, nodes):
+    counts = sorted(len(rules.candidates(node)) for node in nodes)
+    return {
+        "mean": round(sum(counts) / len(counts), 2),
+        "median": counts[len(counts) // 2],
+        "max": counts[-1],
+    }
+
+
+def time_style(rules, body, repeat, ancestors=None, sharing=None):
+    # styles a freshly parsed tree every time, so no run sees an earlier run's styles
+    best = None
+    for _ in range(repeat):
+        tree = HTMLParser(body).parse()
+        if ancestors:
+            ancestors.start(tree)
+        if sharing:
+            sharing.start()
+        start = time.perf_counter()
+        style(tree, rules, None, ancestors, sharing)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    nodes = tree_to_list(tree, [])
+    return best, nodes
+
+
+def filter_runs(index, body, repeat):
+    report = {}
+    for name, ancestors in [("filtered", AncestorFilter()), ("unfiltered", NoAncestorFilter())]:
+        seconds, nodes = time_style(index, body, repeat, ancestors)
+        report[name] = {
+            "nodes": len(nodes),
+            "style_seconds": round(seconds, 6),
+            "us_per_node": round(seconds / len(nodes) * 1e6, 3),
+            "descendant_checks": ancestors.checks // repeat,
+            "fast_rejects": ancestors.rejects // repeat,
+            "fast_reject_rate": round(ancestors.rejects / ancestors.checks, 3) if ancestors.checks else None,
+        }
+    report["speedup"] = round(report["unfiltered"]["us_per_node"] / report["filtered"]["us_per_node"], 2)
+    return report
+
+
+def sharing_runs(index, body, repeat):
+    report = {}
+    for name, sharing in [("shared", StyleSharing()), ("unshared", NoStyleSharing())]:
+        seconds, nodes = time_style(index, body, repeat, None, sharing)
+        styles = {id(node.style): node.style for node in nodes}
+        report[name] = {
+            "nodes": len(nodes),
+            "style_seconds": round(seconds, 6),
+            "us_per_node": round(seconds / len(nodes) * 1e6, 3),
+            "hit_rate": round(sharing.hits / sharing.lookups, 3),
+            "distinct_styles": len(styles),
+            "style_bytes": sum(sys.getsizeof(node_style) for node_style in styles.values()),
+        }
+    report["bytes_saved"] = report["unshared"]["style_bytes"] - report["shared"]["style_bytes"]
+    report["speedup"] = round(report["unshared"]["us_per_node"] / report["shared"]["us_per_node"], 2)
+    return report
+
+
+def restyle_runs(index, body, changes, repeat):
+    # every run changes the style attribute of the same elements, spread through the document
+    tree = HTMLParser(body).parse()
+    style(tree, index, None)
+    nodes = tree_to_list(tree, [])
+    elements = [node for node in nodes if isinstance(node, Element)]
+    step = max(1, len(elements) // changes)
+    targets = elements[step // 2::step][:changes]
+    incremental = full = None
+    restyled = 0
+    for run in range(repeat):
+        for target in targets:
+            target.set_attribute("style", "color:red" if run % 2 == 0 else "color:blue")
+            target.mark_dirty(DIRTY_SELF)
+        changed = []
+        start = time.perf_counter()
+        restyle(tree, index, None, AncestorFilter(), StyleSharing(), changed)
+        elapsed = time.perf_counter() - start
+        if incremental is None or elapsed < incremental:
+            incremental = elapsed
+        restyled = len(changed)
+        start = time.perf_counter()
+        style(tree, index, None)
+        elapsed = time.perf_counter() - start
+        if full is None or elapsed < full:
+            full = elapsed
+    return {
+        "nodes": len(nodes),
+        "changed_elements": len(targets),
+        "restyled_roots": restyled,
+        "incremental_seconds": round(incremental, 6),
+        "full_seconds": round(full, 6),
+        "speedup": round(full / incremental, 1),
+    }
+
+
+def run(rule_count, node_count, linear_node_count, depth, repeat):
+    text, classes = rule_sheet(rule_count)
+    rules = sorted(CSSParser(text).parse(), key=cascade_priority)
+
+    start = time.perf_counter()
+    index = RuleIndex(rules)
+    build_seconds = time.perf_counter() - start
+    seconds, nodes = time_style(index, styled_document(node_count, classes), repeat)
+    indexed = {
+        "nodes": len(nodes),
+        "build_seconds": round(build_seconds, 6),
+        "style_seconds": round(seconds, 6),
+        "us_per_node": round(seconds / len(nodes) * 1e6, 3),
+        "candidates_per_node": candidate_counts(index, nodes),
+    }
+
+    linear_rules = AllRules(rules)
+    seconds, linear_nodes = time_style(linear_rules, styled_document(linear_node_count, classes), 1)
+    per_node = seconds / len(linear_nodes)
+    linear = {
+        "nodes": len(linear_nodes),
+        "style_seconds": round(seconds, 6),
+        "us_per_node": round(per_node * 1e6, 3),
+        "estimated_style_seconds": round(per_node * len(nodes), 3),
+        "candidates_per_node": candidate_counts(linear_rules, linear_nodes),
+    }
+    return {
+        "python": platform.python_version(),
+        "rules": len(rules),
+        "indexed": indexed,
+        "linear": linear,
+        "speedup": round(linear["us_per_node"] / indexed["us_per_node"], 1),
+        "ancestor_filter": {
+            "shallow": filter_runs(index, styled_document(node_count, classes), repeat),
+            "deep": filter_runs(index, nested_document(node_count, classes, depth), repeat),
+            "depth": depth,
+        },
+        "style_sharing": sharing_runs(index, list_document(node_count), repeat),
+        "incremental": restyle_runs(index, list_document(node_count), 10, repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Style benchmark")
+    parser.add_argument("--rules", type=int, default=5000, help="rules in the style sheet")
+    parser.add_argument("--nodes", type=int, default=50000, help="nodes in the document")
+    parser.add_argument("--linear-nodes", type=int, default=2000,
+                        help="nodes in the document styled without the rule index")
+    parser.add_argument("--depth", type=int, default=200, help="nesting depth of the deep document")
+    parser.add_argument("--repeat", type=int, default=3, help="runs, the best one is reported")
+    args = parser.parse_args()
+    print(json.dumps(run(args.rules, args.nodes, args.linear_nodes, args.depth, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
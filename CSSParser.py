@@ -1,127 +1,171 @@
+import re
+
 from Helper.selector import TagSelector, DescendantSelector, ClassSelector
 
+# word characters are alphanumerics and #-.%
+WORD = r"(?:[^\W_]|[#\-.%])+"
+# \w also matches "_" but is much faster to scan, so it is used for text without underscores
+FAST_WORD = r"[\w#\-.%]+"
+WHITESPACE = re.compile(r"\s*")
+PAIR = re.compile(r"\s*({0})\s*:\s*({0})".format(WORD))
+# the same pair, found at the start of every declaration of a block without quoted strings
+PAIRS = re.compile(r"(?:^|(?<=;))\s*({0})\s*:\s*({0})".format(WORD))
+FAST_PAIRS = re.compile(r"(?:^|(?<=;))\s*({0})\s*:\s*({0})".format(FAST_WORD))
+# a tag followed by descendant tags and .classes
+SELECTOR = re.compile(r"\s*{0}(?:\s+(?:\.|(?!\.)){0})*\s*".format(WORD))
+FAST_SELECTOR = re.compile(r"\s*{0}(?:\s+(?:\.|(?!\.)){0})*\s*".format(FAST_WORD))
+COMMENT = re.compile(r"/\*.*?(?:\*/|\Z)", re.DOTALL)
+# text up to the given delimiters, stepping over quoted strings; unrolled, so a failed match does not backtrack exponentially
+QUOTED = r"""[^{0}"']*(?:(?:"[^"]*"|'[^']*')[^{0}"']*)*"""
+# a whole rule without quoted strings or nested blocks
+SIMPLE_RULE = re.compile(r"""([^{}@"']*)\{([^{}"']*)\}\s*""")
+# any other whole rule that is not an at-rule
+RULE = re.compile(r"(?!@)({0})\{{({1})\}}\s*".format(QUOTED.format("{}"), QUOTED.format("}")))
+# every declaration of a block with quoted strings, with its property and value if it has a supported one
+DECLARATIONS = re.compile(r"\s*(?:({0})\s*:\s*({0}))?{1};?".format(WORD, QUOTED.format(";")))
+FAST_DECLARATIONS = re.compile(r"\s*(?:({0})\s*:\s*({0}))?{1};?".format(FAST_WORD, QUOTED.format(";")))
+# runs of text that step over quoted strings and stop at the given delimiters
+PRELUDE_TEXT = re.compile(r"""(?:[^{}"']+|"[^"]*"|'[^']*')*""")
+AT_RULE_TEXT = re.compile(r"""(?:[^{};"']+|"[^"]*"|'[^']*')*""")
+BLOCK_TEXT = re.compile(r"""(?:[^}"']+|"[^"]*"|'[^']*')*""")
+NESTED_BLOCK_TEXT = re.compile(r"""(?:[^{}"']+|"[^"]*"|'[^']*')*""")
+DECLARATION_TEXT = re.compile(r"""(?:[^;"']+|"[^"]*"|'[^']*')*""")
 
 class CSSParser:
     def __init__(self, s):
-        # text
+        # text, without comments
+        if "/*" in s:
+            s = COMMENT.sub(" ", s)
         self.s = s
         # parser's current position in text
         self.i = 0
 
-    def whitespace(self):
-        while self.i < len(self.s) and self.s[self.i].isspace():
-            self.i += 1
-
-    def word(self):
-        start = self.i
-        # increments i through all the word characters
-        # stores where it started and the substring it extracted
-        while self.i < len(self.s):
-            if self.s[self.i].isalnum() or self.s[self.i] in "#-.%":
-                self.i += 1
-            else:
-                break
-        # check that i advanced though at least one character
-        # otherwise it did not point at a word
-        assert self.i > start
-        return self.s[start:self.i]
-
-    def literal(self, literal):
-        # check if a character is literally something
-        assert self.i < len(self.s) and self.s[self.i] == literal
-        self.i += 1
-
-    def pair(self):
-        prop = self.word()
-        self.whitespace()
-        self.literal(":")
-        self.whitespace()
-        val = self.word()
-        return prop.lower(), val
-
     def body(self):
-        # parse sequences by calling the parsing functions in a loop
-        pairs = {}
-        while self.i < len(self.s) and self.s[self.i] != "}":
-            try:
-                prop, val = self.pair()
-                pairs[prop.lower()] = val
-                self.whitespace()
-                self.literal(";")
-                self.whitespace()
-            except AssertionError:
-                # when we cannot correctly parse a property, value pair
-                # skip to the next semicolon/end of string
-                why = self.ignore_until([";", "}"])
-                if why == ";":
-                    self.literal(";")
-                    self.whitespace()
-                else:
-                    break
+        # property/value pairs up to the closing brace or the end of the text
+        end = BLOCK_TEXT.match(self.s, self.i).end()
+        pairs = self.declarations(self.i, end)
+        self.i = end
         return pairs
 
-    def ignore_until(self, chars):
-        # stops at any one of a set of characters and returns it
-        # returns None if at end of file
-        while self.i < len(self.s):
-            if self.s[self.i] in chars:
-                return self.s[self.i]
-            else:
-                self.i += 1
+    def declarations(self, start, end):
+        # only the first word of a value is kept
+        # declarations that do not start with "property: value" are skipped
+        s = self.s
+        pairs = {}
+        i = start
+        while i < end:
+            j = DECLARATION_TEXT.match(s, i, end).end()
+            pair = PAIR.match(s, i, j)
+            if pair:
+                pairs[pair.group(1).lower()] = pair.group(2)
+            i = j + 1
+        return pairs
 
     def selector(self):
-        # create selector objects
-        # base_selectors = []
-        # out = TagSelector(self.word().lower())
-        # self.whitespace()
-        # while self.i < len(self.s) and self.s[self.i] != "{":
-        #     if self.s[self.i] == ".":
-        #         self.i += 1  # Move past the dot character
-        #         class_name = self.word().lower()
-        #         class_selector = ClassSelector(class_name)
-        #         base_selectors.append(class_selector)
-        #     else:
-        #         tag = self.word()
-        #         descendant = TagSelector(tag.lower())
-        #         base_selectors.append(descendant)
-        #     out = DescendantSelector(base_selectors)
-        #     self.whitespace()
-        # return out
-        out = TagSelector(self.word().lower())
-        self.whitespace()
-        while self.i < len(self.s) and self.s[self.i] != "{":
-            base_selectors = [out]
-            if self.s[self.i] == ".":
-                self.i += 1  # Move past the dot character
-                class_name = self.word().lower()
-                class_selector = ClassSelector(class_name)
-                base_selectors.append(class_selector)
-            else:
-                tag = self.word()
-                descendant = TagSelector(tag.lower())
-                base_selectors.append(descendant)
-            out = DescendantSelector(base_selectors)
-            self.whitespace()
-        return out
+        # parse one selector up to the next block, None if it is not supported
+        end = PRELUDE_TEXT.match(self.s, self.i).end()
+        selector = parse_selector(self.s[self.i:end])
+        self.i = end
+        return selector
 
     def parse(self):
         # css files are a sequence of selectors and blocks
+        # unsupported selectors and at-rules are skipped a whole block at a time
+        s = self.s
+        end = len(s)
         rules = []
-        while self.i < len(self.s):
-            try:
-                self.whitespace()
-                selector = self.selector()
-                self.literal("{")
-                self.whitespace()
-                body = self.body()
-                self.literal("}")
-                rules.append((selector, body))
-            except AssertionError:
-                # if there is a parse error skip the whole rule
-                why = self.ignore_until(["}"])
-                if why == "}":
-                    self.literal("}")
-                    self.whitespace()
+        # selectors by their text, since large style sheets repeat them
+        selectors = {}
+        i = WHITESPACE.match(s, self.i).end()
+        while i < end:
+            rule = SIMPLE_RULE.match(s, i)
+            quoted = rule is None
+            if quoted:
+                rule = RULE.match(s, i)
+            if rule:
+                prelude, text = rule.groups()
+                if prelude in selectors:
+                    rule_selectors = selectors[prelude]
                 else:
+                    rule_selectors = selectors[prelude] = parse_selector_list(prelude)
+                if rule_selectors:
+                    if quoted:
+                        body = quoted_block(text)
+                    else:
+                        pairs = FAST_PAIRS if "_" not in text else PAIRS
+                        body = {prop.lower(): value for prop, value in pairs.findall(text)}
+                    for selector in rule_selectors:
+                        rules.append((selector, body))
+                i = rule.end()
+                continue
+            if s[i] == "@":
+                i = self.skip_at_rule(i)
+            else:
+                # anything else is a stray closing brace, or an unterminated rule or string
+                prelude_end = PRELUDE_TEXT.match(s, i).end()
+                if prelude_end >= end or s[prelude_end] != "}":
                     break
+                i = prelude_end + 1
+            i = WHITESPACE.match(s, i).end()
+        self.i = end
         return rules
+
+    def skip_at_rule(self, i):
+        # at-rules end at a semicolon or after their (possibly nested) block
+        s = self.s
+        i = AT_RULE_TEXT.match(s, i).end()
+        if i >= len(s) or s[i] == "}":
+            return i
+        if s[i] == ";":
+            return i + 1
+        if s[i] != "{":
+            return len(s)
+        depth = 0
+        while i < len(s):
+            if s[i] == "{":
+                depth += 1
+            elif s[i] == "}":
+                depth -= 1
+                if depth == 0:
+                    return i + 1
+            else:
+                # unterminated string
+                return len(s)
+            i = NESTED_BLOCK_TEXT.match(s, i + 1).end()
+        return i
+
+
+def quoted_block(text):
+    # the declarations of a block with quoted strings, found by one findall
+    declarations = FAST_DECLARATIONS if "_" not in text else DECLARATIONS
+    return {prop.lower(): value for prop, value in declarations.findall(text) if prop}
+
+
+def parse_selector_list(text):
+    # comma separated selectors are only used if all of them are supported
+    if "," not in text:
+        selector = parse_selector(text)
+        return [selector] if selector else None
+    selectors = []
+    for part in text.split(","):
+        selector = parse_selector(part)
+        if not selector:
+            return None
+        selectors.append(selector)
+    return selectors
+
+
+def parse_selector(text):
+    # a tag followed by descendant tags and .classes, separated by whitespace
+    selector = FAST_SELECTOR if "_" not in text else SELECTOR
+    if not selector.fullmatch(text):
+        return None
+    parts = text.lower().split()
+    out = TagSelector(parts[0])
+    for part in parts[1:]:
+        if part[0] == ".":
+            base = ClassSelector(part[1:])
+        else:
+            base = TagSelector(part)
+        out = DescendantSelector([out, base])
+    return out
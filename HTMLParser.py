@@ -1,4 +1,17 @@
-from Helper.tokens import Text, Element
+import re
+import sys
+
+from Helper.tokens import Text, Element, NO_CHILDREN
+
+TAG_BOUNDARY = re.compile(r"[<>]")
+# "&amp;" decodes to "&", which can start another entity
+ENTITY = re.compile(r"&(?:amp;)*(lt;|gt;|shy|quot;)|&(?:amp;)+")
+ENTITIES = {
+    "lt;": "<",
+    "gt;": ">",
+    "shy": "\N{soft hyphen}",
+    "quot;": "\"",
+}
 
 
 class HTMLParser:
@@ -15,74 +28,180 @@ class HTMLParser:
     def __init__(self, body):
         self.body = body
         self.unfinished = []
+        # scanner state
+        self.pos = 0
+        self.text = []
+        self.in_tag = False
+        self.in_script = False
+        self.read_text = True
+        self.last_known_tag = False
+        self.window_start = 0
+        self.quote_count = 0
+        self.quote_pos = 0
 
-    def parse(self):
-        last_ten_chars = "          "
-        text = ""
-        in_tag = False
-        in_quotes = False
-        in_script = False
-        read_text = True
-        last_known_tag = False
-        for c in self.body:
-            last_ten_chars = last_ten_chars[-9:] + c
-            if c == "\"":
-                in_quotes = not in_quotes
-            # check for comments
-            if last_ten_chars[-4:] == "<!--":
-                read_text = False
-                in_tag = last_known_tag
-                last_ten_chars = "          "
-                text = text[:-2]
-            elif last_ten_chars[-3:] == "-->":
-                read_text = True
-                continue
-            # proceed if not in a comment
-            if read_text:
-                if in_script:
-                    if last_ten_chars[-9:] == "</script>":
-                        text = text[:-8]
-                        # add content inside of script tags as text
-                        if text:
-                            self.add_text(text)
-                        text = ""
-                        # close of the tag
-                        last_known_tag = False
-                        in_tag = False
-                        in_script = False
-                        self.add_tag("/script")
-                    else:
-                        text += c
-                else:
-                    # check for tags
-                    if c == "<":
-                        last_known_tag = in_tag
-                        in_tag = True
-                        if text:
-                            self.add_text(text)
-                        text = ""
-                    elif c == ">" and not in_quotes:
-                        last_known_tag = in_tag
-                        in_tag = False
-                        self.add_tag(text)
-                        in_script = check_in_script(text)
-                        text = ""
-                    else:
-                        text += c
-                        if text[-4:] == '&lt;':
-                            text = text[:-4] + '<'
-                        elif text[-4:] == '&gt;':
-                            text = text[:-4] + '>'
-                        elif text[-4:] == '&shy':
-                            text = text[:-4] + '\N{soft hyphen}'
-                        elif text[-5:] == '&amp;':
-                            text = text[:-5] + '&'
-                        elif text[-6:] == '&quot;':
-                            text = text[:-6] + '\"'
-        if not in_tag and text:
+    def feed(self, chunk):
+        # drop the consumed input, keeping two characters for the "-->" check
+        cut = max(0, self.pos - 2)
+        if cut:
+            if cut > self.quote_pos:
+                self.quote_count += self.body.count("\"", self.quote_pos, cut)
+                self.quote_pos = cut
+            self.body = self.body[cut:]
+            self.pos -= cut
+            self.window_start -= cut
+            self.quote_pos -= cut
+        self.body += chunk
+        self.scan(final=False)
+
+    def close(self):
+        self.scan()
+        # flush any text that is still pending at the end of the body
+        text = self.take_text()
+        if not self.in_tag and text:
             self.add_text(text)
         return self.finish()
 
+    def parse(self):
+        return self.close()
+
+    def parse_fragment(self, context):
+        # parse straight into an existing element, replacing its children
+        # the context element can not be closed and only an <html> context gets implicit tags
+        context.children = NO_CHILDREN
+        self.unfinished = [context]
+        self.close()
+        return context.children
+
+    def scan(self, final=True):
+        # jump between tag, comment and script boundaries instead of walking every character
+        # unless this is the final input, stop where the next token could still change
+        while self.pos < len(self.body):
+            if not self.read_text:
+                progress = self.scan_comment(final)
+            elif self.in_script:
+                progress = self.scan_script(final)
+            else:
+                progress = self.scan_markup(final)
+            if not progress:
+                break
+
+    def scan_markup(self, final):
+        body = self.body
+        pos = self.pos
+        match = TAG_BOUNDARY.search(body, pos)
+        if not match:
+            self.text.append(body[pos:])
+            self.pos = len(body)
+            return True
+        i = match.start()
+        if i > pos:
+            self.text.append(body[pos:i])
+        self.pos = i
+        if body[i] == "<":
+            # wait until we know whether this opens a comment
+            if not final and i + 3 >= len(body):
+                return False
+            self.last_known_tag = self.in_tag
+            self.in_tag = True
+            text = self.take_text()
+            if text:
+                self.add_text(text)
+            if body.startswith("!--", i + 1):
+                # comments restore the tag state from before the "<"
+                self.in_tag = self.last_known_tag
+                self.start_comment(i + 4)
+            else:
+                self.pos = i + 1
+        elif i - 2 >= self.window_start and body[i - 2:i] == "--":
+            # a stray "-->" swallows its ">"
+            self.pos = i + 1
+        elif self.in_quotes(i):
+            self.text.append(">")
+            self.pos = i + 1
+        else:
+            text = self.take_text()
+            self.last_known_tag = self.in_tag
+            self.in_tag = False
+            self.add_tag(text)
+            self.in_script = check_in_script(text)
+            self.pos = i + 1
+        return True
+
+    def scan_script(self, final):
+        # script contents are added verbatim until the closing tag
+        body = self.body
+        pos = self.pos
+        close = body.find("</script>", pos)
+        limit = close + 8 if close >= 0 else len(body)
+        comment = body.find("<!--", pos, limit)
+        dashes = body.find("-->", pos, limit)
+        if comment >= 0 and (dashes < 0 or comment + 1 < dashes):
+            # keep the "<" of the comment opener, like the character loop did
+            self.text.append(body[pos:comment + 1])
+            self.in_tag = self.last_known_tag
+            self.start_comment(comment + 4)
+        elif dashes >= 0:
+            self.text.append(body[pos:dashes + 2])
+            self.pos = dashes + 3
+        elif close >= 0:
+            self.text.append(body[pos:close])
+            # add content inside of script tags as text
+            text = self.take_text()
+            if text:
+                self.add_text(text)
+            # close of the tag
+            self.last_known_tag = False
+            self.in_tag = False
+            self.in_script = False
+            self.add_tag("/script")
+            self.pos = close + 9
+        else:
+            # the last characters could be the start of a marker
+            end = len(body) if final else max(pos, len(body) - 8)
+            self.text.append(body[pos:end])
+            self.pos = end
+            return False
+        return True
+
+    def scan_comment(self, final):
+        body = self.body
+        pos = self.pos
+        dashes = body.find("-->", pos)
+        limit = dashes + 3 if dashes >= 0 else len(body)
+        comment = body.find("<!--", pos, limit)
+        if comment >= 0 and (dashes < 0 or comment + 1 < dashes):
+            # a nested comment opener resets the window again
+            text = "".join(self.text)[:-2]
+            self.text = [text] if text else []
+            self.in_tag = self.last_known_tag
+            self.start_comment(comment + 4)
+        elif dashes >= 0:
+            self.read_text = True
+            self.pos = dashes + 3
+        else:
+            self.pos = len(body) if final else max(pos, len(body) - 3)
+            return False
+        return True
+
+    def start_comment(self, pos):
+        self.read_text = False
+        # closing markers must start after the comment opener
+        self.window_start = pos
+        self.pos = pos
+
+    def in_quotes(self, i):
+        # every double quote seen so far toggles the quoting state
+        self.quote_count += self.body.count("\"", self.quote_pos, i)
+        self.quote_pos = i
+        return self.quote_count % 2 == 1
+
+    def take_text(self):
+        text = "".join(self.text)
+        self.text = []
+        if self.in_script:
+            return text
+        return decode_entities(text)
+
     # add a new node as the child of the last unfinished node
     def add_text(self, text):
         # ignore whitespace
@@ -91,7 +210,7 @@ class HTMLParser:
         self.implicit_tags()
         parent = self.unfinished[-1]
         node = Text(text, parent)
-        parent.children.append(node)
+        parent.append_child(node)
 
     def add_tag(self, tag):
         tag, attributes = get_attributes(tag)
@@ -103,31 +222,33 @@ class HTMLParser:
         if tag.startswith("/"):
             if len(self.unfinished) == 1:
                 return
-            # close tag removes the last unfinished node and adds the  next unfinished node in the list
-            node = self.unfinished.pop()
-            parent = self.unfinished[-1]
-            parent.children.append(node)
+            # close tag removes the last unfinished node
+            self.unfinished.pop()
         elif tag in self.SELF_CLOSING_TAGS:
             # auto close any tags that are part of this list
             parent = self.unfinished[-1]
             node = Element(tag, attributes, parent)
-            parent.children.append(node)
+            parent.append_child(node)
         else:
             # open tag adds an unfinished node to the end of the list
+            # it is attached to its parent right away so a partial tree can be rendered
             parent = self.unfinished[-1] if self.unfinished else None
             node = Element(tag, attributes, parent)
+            if parent:
+                parent.append_child(node)
             self.unfinished.append(node)
 
     # turn incomplete tree to a complete tree by finishing unfinished nodes
     def finish(self):
         if len(self.unfinished) == 0:
             self.add_tag("html")
-        while len(self.unfinished) > 1:
-            node = self.unfinished.pop()
-            parent = self.unfinished[-1]
-            parent.children.append(node)
+        del self.unfinished[1:]
         return self.unfinished.pop()
 
+    # root of the tree parsed so far, with unfinished nodes already attached
+    def partial_tree(self):
+        return self.unfinished[0] if self.unfinished else None
+
     def print_tree(self, node, indent=0):
         print(" " * indent, node)
         for child in node.children:
@@ -144,17 +265,22 @@ class HTMLParser:
         # compare the list of unfinished tags to figure out which ones have been omitted
         # more than one tag can be omitted in each row -> loop
         while True:
-            open_tags = [node.tag for node in self.unfinished]
+            unfinished = self.unfinished
+            depth = len(unfinished)
+            # once the document is past <html><head> nothing can be implicit
+            if depth > 2 or depth and unfinished[0].tag != "html":
+                break
             # necessary when the first tag in the document is something other than <html>
-            if open_tags == [] and tag != "html":
+            if depth == 0 and tag != "html":
                 self.add_tag("html")
-            elif open_tags == ["html"] and tag not in ["head", "body", "/html"]:
+            elif depth == 1 and tag not in ["head", "body", "/html"]:
                 # head and body tags can be omitted
                 if tag in self.HEAD_TAGS:
                     self.add_tag("head")
                 else:
                     self.add_tag("body")
-            elif open_tags == ["html", "head"] and tag not in ["/head"] + self.HEAD_TAGS:
+            elif depth == 2 and unfinished[1].tag == "head" \
+                    and tag != "/head" and tag not in self.HEAD_TAGS:
                 # the /head tag can also be implicit
                 self.add_tag("/head")
             else:
@@ -171,10 +297,10 @@ def get_attributes(text):
             # value can also be quoted -> strip the quote out
             if len(value) > 2 and value[0] in ["'", "\""]:
                 value = value[1:-1]
-            attributes[key.lower()] = value
+            attributes[sys.intern(key.lower())] = value
         else:
             # empty string attribute
-            attributes[attrpair.lower()] = ""
+            attributes[sys.intern(attrpair.lower())] = ""
     return tag, attributes
 
 
@@ -182,3 +308,14 @@ def check_in_script(text):
     parts = text.split()
     tag = parts[0].lower()
     return tag == "script"
+
+
+def decode_entities(text):
+    if "&" not in text:
+        return text
+    return ENTITY.sub(replace_entity, text)
+
+
+def replace_entity(match):
+    entity = match.group(1)
+    return ENTITIES[entity] if entity else "&"
@@ -0,0 +1,60 @@
+# counting Bloom filter of the tags and classes of the elements above the node being styled,
+# so descendant selectors whose ancestors are definitely missing are rejected without walking parents
+FILTER_BITS = 8
+FILTER_SIZE = 1 << FILTER_BITS
+MASK = FILTER_SIZE - 1
+
+
+def element_hashes(node):
+    # the same keys TagSelector.key and ClassSelector.key use
+    hashes = [hash(node.tag)]
+    cls = node.attributes.get("class")
+    if cls is not None:
+        hashes.append(hash("." + cls))
+    return hashes
+
+
+def key_mask(h):
+    # the two filter slots a key hash sets
+    return (1 << (h & MASK)) | (1 << ((h >> FILTER_BITS) & MASK))
+
+
+class AncestorFilter:
+    def __init__(self):
+        self.counts = [0] * FILTER_SIZE
+        # bit i is set while counts[i] is not zero, so a lookup is a single and
+        self.bits = 0
+        # descendant selectors looked up, and how many of them were rejected
+        self.checks = 0
+        self.rejects = 0
+
+    def start(self, node):
+        # fill the filter with the ancestors of the node a style pass starts at
+        self.counts = [0] * FILTER_SIZE
+        self.bits = 0
+        parent = node.parent
+        while parent:
+            self.push(parent)
+            parent = parent.parent
+
+    def push(self, node):
+        counts = self.counts
+        for h in element_hashes(node):
+            for slot in h & MASK, (h >> FILTER_BITS) & MASK:
+                if not counts[slot]:
+                    self.bits |= 1 << slot
+                counts[slot] += 1
+
+    def pop(self, node):
+        counts = self.counts
+        for h in element_hashes(node):
+            for slot in h & MASK, (h >> FILTER_BITS) & MASK:
+                counts[slot] -= 1
+                if not counts[slot]:
+                    self.bits &= ~(1 << slot)
+
+    def text(self):
+        if not self.checks:
+            return ""
+        return "Ancestor filter: rejected {} of {} descendant selector checks ({:.0f}%)".format(
+            self.rejects, self.checks, self.rejects / self.checks * 100)
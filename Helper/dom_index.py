@@ -0,0 +1,90 @@
+# elements of a page by tag, class and id, so selector queries and anchor jumps
+# look up the few elements that could match instead of walking the whole tree
+from Helper.tokens import Element
+
+
+class DOMIndex:
+    def __init__(self, root):
+        self.root = root
+        # dicts used as ordered sets, in document order unless their key is in unsorted
+        self.by_tag = {}
+        self.by_class = {}
+        self.by_id = {}
+        # (bucket, key) pairs that gained elements inserted into the middle of the document
+        self.unsorted = set()
+        # document position of every node, computed again after the tree changes
+        self.positions = None
+        self.add(root, False)
+
+    def add(self, node, inserted=True):
+        for elt in elements(node):
+            for bucket, key in self.keys(elt):
+                bucket.setdefault(key, {})[elt] = None
+                if inserted:
+                    self.unsorted.add((id(bucket), key))
+        if inserted:
+            self.positions = None
+
+    def remove(self, node):
+        for elt in elements(node):
+            for bucket, key in self.keys(elt):
+                entries = bucket.get(key)
+                if entries is not None:
+                    entries.pop(elt, None)
+                    if not entries:
+                        del bucket[key]
+
+    def replace_children(self, node, old_children):
+        # node's children were replaced, as by innerHTML; the index only holds the elements under
+        # root, so an element an earlier replacement took out of the page changes nothing
+        if node is not self.root and node not in self.by_tag.get(node.tag, ()):
+            return
+        for child in old_children:
+            self.remove(child)
+        for child in node.children:
+            self.add(child)
+
+    def keys(self, elt):
+        attributes = elt.attributes
+        yield self.by_tag, elt.tag
+        if "class" in attributes:
+            yield self.by_class, attributes["class"]
+        if "id" in attributes:
+            yield self.by_id, attributes["id"]
+
+    def lookup(self, bucket, key):
+        # elements with key, in document order
+        entries = bucket.get(key)
+        if not entries:
+            return []
+        if (id(bucket), key) in self.unsorted:
+            if self.positions is None:
+                self.positions = {node: i for i, node in enumerate(elements(self.root))}
+            positions = self.positions
+            # elements no longer under root are dropped rather than sorted
+            entries = [elt for elt in entries if elt in positions]
+            entries = dict.fromkeys(sorted(entries, key=positions.__getitem__))
+            bucket[key] = entries
+            self.unsorted.discard((id(bucket), key))
+        return list(entries)
+
+    def tag(self, tag):
+        return self.lookup(self.by_tag, tag)
+
+    def cls(self, cls):
+        return self.lookup(self.by_class, cls)
+
+    def element_by_id(self, ident):
+        # the last element with the id, like the anchor search this replaces
+        found = self.lookup(self.by_id, ident)
+        return found[-1] if found else None
+
+
+def elements(node):
+    # the elements of node's subtree in document order
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Element):
+            yield node
+            stack.extend(reversed(node.children))
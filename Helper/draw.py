@@ -1,6 +1,8 @@
 import skia
 
 from Helper.animation import parse_transform
+from Helper.font_manager import measure_text
+from Helper.traversal import walk
 
 
 class DisplayItem:
@@ -19,17 +21,39 @@ class DisplayItem:
         return rect
 
     def add_composited_bounds(self, rect):
-        rect.join(self.rect)
-        for cmd in self.children:
-            cmd.add_composited_bounds(rect)
+        for cmd in walk(self):
+            rect.join(cmd.rect)
+
+    def execute(self, canvas):
+        # visual effects run their children between enter() and leave(); nested effects
+        # are handled with a stack, so deep display lists do not recurse
+        self.enter(canvas)
+        stack = [(self, iter(self.children))]
+        while stack:
+            effect, children = stack[-1]
+            cmd = next(children, None)
+            if cmd is None:
+                stack.pop()
+                effect.leave(canvas)
+            elif cmd.children:
+                cmd.enter(canvas)
+                stack.append((cmd, iter(cmd.children)))
+            else:
+                cmd.execute(canvas)
+
+    def enter(self, canvas):
+        pass
+
+    def leave(self, canvas):
+        pass
 
 
 class DrawText(DisplayItem):
     def __init__(self, x1, y1, text, font, color):
         self.left = x1
         self.top = y1
-        self.right = x1 + font.measureText(text)
-        self.bottom = y1 - font.getMetrics().fAscent + font.getMetrics().fDescent
+        self.right = x1 + measure_text(font, text)
+        self.bottom = y1 - font.ascent + font.descent
         self.font = font
         self.text = text
         self.color = color
@@ -97,12 +121,12 @@ class ClipRRect(DisplayItem):
         self.radius = radius
         self.rrect = skia.RRect.MakeRectXY(rect, radius, radius)
 
-    def execute(self, canvas):
+    def enter(self, canvas):
         if self.should_clip:
             canvas.save()
             canvas.clipRRect(self.rrect)
-        for cmd in self.children:
-            cmd.execute(canvas)
+
+    def leave(self, canvas):
         if self.should_clip:
             canvas.restore()
 
@@ -118,11 +142,11 @@ class SaveLayer(DisplayItem):
         if should_save:
             self.needs_compositing = True
 
-    def execute(self, canvas):
+    def enter(self, canvas):
         if self.should_save:
             canvas.saveLayer(paint=self.sk_paint)
-        for cmd in self.children:
-            cmd.execute(canvas)
+
+    def leave(self, canvas):
         if self.should_save:
             canvas.restore()
 
@@ -199,13 +223,13 @@ class Transform(DisplayItem):
         super().__init__(rect, children, node)
         self.translation = translation
 
-    def execute(self, canvas):
+    def enter(self, canvas):
         if self.translation:
             (x, y) = self.translation
             canvas.save()
             canvas.translate(x, y)
-        for cmd in self.children:
-            cmd.execute(canvas)
+
+    def leave(self, canvas):
         if self.translation:
             canvas.restore()
 
@@ -257,7 +281,7 @@ def draw_text(canvas, x, y, text, font, color=None):
     sk_color = parse_color(color)
     paint = skia.Paint(AntiAlias=True, Color=sk_color)
     canvas.drawString(
-        text, float(x), y - font.getMetrics().fAscent,
+        text, float(x), y - font.ascent,
         font, paint)
 
 
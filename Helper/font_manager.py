@@ -1,6 +1,166 @@
+# fonts, and the widths of the text measured with them, shared by every layout and display object
+import threading
+from collections import OrderedDict
+
+import numpy
 import skia
 
 FONTS = {}
+MAX_FONTS = 256
+MAX_TEXT_WIDTHS = 65536
+# advance tables start with latin-1 and double until they cover the code points a page uses
+MIN_ADVANCE_TABLE = 256
+MAX_ADVANCE_TABLE = 0x10000
+MAX_ADVANCE_TABLES = 64
+
+
+class Font(skia.Font):
+    # a skia font that knows which typeface and size it was made from, so text widths can be cached by them,
+    # with the metrics layout and paint use measured once; fonts are shared, so they must not be changed
+    def __init__(self, typeface, typeface_id, size):
+        super().__init__(typeface, size)
+        self.typeface_id = typeface_id
+        self.font_size = size
+        metrics = self.getMetrics()
+        # ascent is negative, above the baseline, as in skia
+        self.ascent = metrics.fAscent
+        self.descent = metrics.fDescent
+        self.linespace = self.descent - self.ascent
+        self.space_width = self.measureText(" ")
+
+
+class FontCache:
+    # one shared font per family, size, weight and slant, with the least recently used ones dropped
+    def __init__(self, size):
+        self.size = size
+        self.fonts = OrderedDict()
+        self.lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.evictions = 0
+
+    def get(self, family, size, weight, slant):
+        key = (family, size, weight, slant)
+        # fonts are made under the lock too, since typeface ids are handed out in order
+        with self.lock:
+            self.lookups += 1
+            font = self.fonts.get(key)
+            if font is not None:
+                self.hits += 1
+                self.fonts.move_to_end(key)
+                return font
+            font = make_font(family, size, weight, slant)
+            self.fonts[key] = font
+            if len(self.fonts) > self.size:
+                self.fonts.popitem(last=False)
+                self.evictions += 1
+        return font
+
+    def text(self):
+        if not self.lookups:
+            return ""
+        return "Font cache: {} of {} fonts reused ({:.0f}%), {} made, {} cached, {} evicted".format(
+            self.hits, self.lookups, self.hits / self.lookups * 100, self.lookups - self.hits,
+            len(self.fonts), self.evictions)
+
+
+fonts = FontCache(MAX_FONTS)
+
+
+class TextWidthCache:
+    # widths of strings by typeface, size and text; words repeat throughout a page and across
+    # layouts after zooming, resizing and animation frames, so most widths are measured once
+    def __init__(self, size):
+        self.size = size
+        self.widths = OrderedDict()
+        self.lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.evictions = 0
+
+    def measure(self, font, text):
+        key = (font.typeface_id, font.font_size, text)
+        with self.lock:
+            self.lookups += 1
+            width = self.widths.get(key)
+            if width is not None:
+                self.hits += 1
+                self.widths.move_to_end(key)
+                return width
+        width = font.measureText(text)
+        with self.lock:
+            self.widths[key] = width
+            if len(self.widths) > self.size:
+                self.widths.popitem(last=False)
+                self.evictions += 1
+        return width
+
+    def text(self):
+        if not self.lookups:
+            return ""
+        return "Text width cache: {} of {} widths reused a measurement ({:.0f}%), {} cached, {} evicted".format(
+            self.hits, self.lookups, self.hits / self.lookups * 100, len(self.widths), self.evictions)
+
+
+text_widths = TextWidthCache(MAX_TEXT_WIDTHS)
+
+
+def measure_text(font, text):
+    return text_widths.measure(font, text)
+
+
+class GlyphAdvances:
+    # the advance of every code point's glyph, as one array per typeface and size; text without
+    # kerning or shaping is as wide as the sum of its advances, which is what measureText adds up
+    def __init__(self, size):
+        self.size = size
+        self.tables = OrderedDict()
+        self.lock = threading.Lock()
+
+    def table(self, font, length):
+        # advances covering at least the first length code points
+        key = (font.typeface_id, font.font_size)
+        with self.lock:
+            table = self.tables.get(key)
+            if table is not None:
+                self.tables.move_to_end(key)
+                if len(table) >= length:
+                    return table
+            size = len(table) if table is not None else MIN_ADVANCE_TABLE
+            while size < length:
+                size *= 2
+            glyphs = font.unicharsToGlyphs(list(range(size)))
+            table = numpy.array(font.getWidths(glyphs), dtype=numpy.float32)
+            self.tables[key] = table
+            if len(self.tables) > self.size:
+                self.tables.popitem(last=False)
+            return table
+
+
+glyph_advances = GlyphAdvances(MAX_ADVANCE_TABLES)
+
+
+def word_widths(font, words):
+    # the widths of all words at once: one array of code points, looked up in the font's advance
+    # table and summed per word, instead of a measureText call for every word
+    if not words:
+        return []
+    codes = numpy.frombuffer("".join(words).encode("utf-32-le", "surrogatepass"), dtype=numpy.uint32)
+    if not len(codes):
+        return [0.0] * len(words)
+    top = int(codes.max())
+    if top >= MAX_ADVANCE_TABLE:
+        return [measure_text(font, word) for word in words]
+    advances = glyph_advances.table(font, top + 1)[codes]
+    lengths = numpy.fromiter(map(len, words), dtype=numpy.intp, count=len(words))
+    starts = numpy.zeros(len(words), dtype=numpy.intp)
+    numpy.cumsum(lengths[:-1], out=starts[1:])
+    # reduceat takes the advance at an empty word's start instead of summing nothing,
+    # so empty words are left out of it and keep a width of 0
+    nonempty = lengths > 0
+    widths = numpy.zeros(len(words), dtype=advances.dtype)
+    widths[nonempty] = numpy.add.reduceat(advances, starts[nonempty])
+    return widths.tolist()
 
 
 def get_font(node, size_delta=0):
@@ -31,6 +191,10 @@ def find_inherited_property(node, prop, default_val):
 
 
 def get_cached_font(family, size, weight, slant):
+    return fonts.get(family, size, weight, slant)
+
+
+def make_font(family, size, weight, slant):
     key = (family, weight, slant)
     if key not in FONTS:
         if weight == "bold":
@@ -44,10 +208,8 @@ def get_cached_font(family, size, weight, slant):
         skia_width = skia.FontStyle.kNormal_Width
         style_info = skia.FontStyle(skia_weight, skia_width, skia_style)
         font = skia.Typeface(family, style_info)
-        FONTS[key] = font
-    return skia.Font(FONTS[key], size)
-
+        # typefaces are never dropped, so their position is a stable id
+        FONTS[key] = (font, len(FONTS))
+    typeface, typeface_id = FONTS[key]
+    return Font(typeface, typeface_id, size)
 
-def linespace(font):
-    metrics = font.getMetrics()
-    return metrics.fDescent - metrics.fAscent
@@ -0,0 +1,95 @@
+# speculative fetching of scripts and style sheets found in the raw page text
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from HTMLParser import get_attributes
+from Requests.request import resolve_url
+
+SUBRESOURCE_TAG = re.compile(r"<((?:script|link)\s[^>]*)>", re.IGNORECASE)
+MAX_PENDING = 4096
+MAX_PRELOAD_WORKERS = 4
+# a speculative download still running after this long is left alone and requested again
+PRELOAD_TIMEOUT_SEC = 10
+
+
+# looks ahead of the parser for subresources so their downloads overlap with parsing
+class PreloadScanner:
+    def __init__(self, request_handler, allowed_request):
+        # downloads go through the tab's request handler, so cacheable responses also land in its cache,
+        # a few at a time on a small pool of threads
+        self.request_handler = request_handler
+        self.executor = ThreadPoolExecutor(MAX_PRELOAD_WORKERS, thread_name_prefix="preload")
+        self.allowed_request = allowed_request
+        self.base_url = None
+        self.pending = ""
+        self.fetches = {}
+        # how many speculative fetches were used, needed but missing, or never used
+        self.hits = 0
+        self.misses = 0
+        self.unused = 0
+
+    def start(self, base_url):
+        # the previous page's downloads that did not start yet are not needed anymore
+        self.cancel()
+        self.pending = ""
+        self.base_url = base_url
+
+    def cancel(self):
+        for fetch in self.fetches.values():
+            fetch.cancel()
+        self.unused += len(self.fetches)
+        self.fetches = {}
+
+    def close(self):
+        # on quit, downloads that did not start are dropped and running ones are not waited for
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def feed(self, chunk):
+        text = self.pending + chunk
+        end = 0
+        for match in SUBRESOURCE_TAG.finditer(text):
+            end = match.end()
+            tag, attributes = get_attributes(match.group(1))
+            if tag == "script" and "src" in attributes:
+                self.preload(attributes["src"])
+            elif tag == "link" and "href" in attributes and attributes.get("rel") == "stylesheet":
+                self.preload(attributes["href"])
+        # keep a tag that is cut off at the end of the chunk for the next one
+        start = text.rfind("<", end)
+        if start >= 0 and text.find(">", start) < 0 and len(text) - start < MAX_PENDING:
+            self.pending = text[start:]
+        else:
+            self.pending = ""
+
+    def preload(self, link):
+        try:
+            url = resolve_url(link, self.base_url)
+        except ValueError:
+            # pages like data: urls have no base to resolve against
+            return
+        if url in self.fetches or not self.allowed_request(url):
+            return
+        self.fetches[url] = self.executor.submit(self.request_handler.request, url, self.base_url)
+
+    def take(self, url):
+        # returns the speculative response for url, or None if it was never preloaded or its
+        # download failed, so the caller makes the request itself and sees its errors
+        fetch = self.fetches.pop(url, None)
+        if not fetch:
+            self.misses += 1
+            return None
+        try:
+            response = fetch.result(PRELOAD_TIMEOUT_SEC)
+        except Exception:
+            fetch.cancel()
+            self.misses += 1
+            return None
+        self.hits += 1
+        return response
+
+    def text(self):
+        if not self.hits and not self.misses and not self.unused and not self.fetches:
+            return ""
+        return "Preload: {} hits, {} misses, {} unused".format(
+            self.hits, self.misses, self.unused + len(self.fetches))
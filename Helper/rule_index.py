@@ -0,0 +1,56 @@
+# rules bucketed by the tag and class of their rightmost selector, so styling a node
+# only tests the rules that could possibly match it instead of every rule
+from Helper.selector import TagSelector, ClassSelector, rightmost
+from Helper.tokens import Element
+
+
+class RuleIndex:
+    def __init__(self, rules=()):
+        self.by_tag = {}
+        self.by_class = {}
+        # rules that can not be bucketed are candidates for every node
+        self.unindexed = []
+        self.count = 0
+        # nodes with the same tag and class share one candidate list
+        self.candidate_lists = {}
+        self.add(rules)
+
+    def __len__(self):
+        return self.count
+
+    def add(self, rules):
+        # rules are kept in cascade order, by selector priority and then by the order they were added,
+        # so a style sheet arriving later only costs indexing its own rules
+        for selector, body in rules:
+            entry = ((selector.priority, self.count), selector, body)
+            self.count += 1
+            key = rightmost(selector)
+            if isinstance(key, TagSelector):
+                self.by_tag.setdefault(key.tag, []).append(entry)
+            elif isinstance(key, ClassSelector):
+                self.by_class.setdefault(key.cls, []).append(entry)
+            else:
+                self.unindexed.append(entry)
+        self.candidate_lists = {}
+
+    def candidates(self, node):
+        # (selector, body) pairs that may match node, in cascade order
+        if isinstance(node, Element):
+            key = (node.tag, node.attributes.get("class"))
+        else:
+            key = None
+        candidates = self.candidate_lists.get(key)
+        if candidates is None:
+            candidates = self.merge(key)
+            self.candidate_lists[key] = candidates
+        return candidates
+
+    def merge(self, key):
+        entries = list(self.unindexed)
+        if key:
+            tag, cls = key
+            entries.extend(self.by_tag.get(tag, ()))
+            if cls is not None:
+                entries.extend(self.by_class.get(cls, ()))
+        entries.sort(key=lambda entry: entry[0])
+        return [(selector, body) for _, selector, body in entries]
@@ -1,10 +1,26 @@
+# every selector compiles itself into a matches closure with its tag and class inlined,
+# which replaces the generic matches method on the instance; the methods define the semantics.
+# selectors compile on their first match, since most rules of a large style sheet never match anything
+import sys
+from functools import cached_property
+
+from Helper.ancestor_filter import key_mask
 from Helper.tokens import Element
 
 
 class TagSelector:
+    # simple selectors put no condition on the ancestors
+    ancestor_masks = ()
+
     def __init__(self, tag):
-        self.tag = tag
+        self.tag = sys.intern(tag)
         self.priority = 1
+        # what the ancestor filter records for the elements it matches
+        self.key = tag
+        self.matches = self.compile
+
+    def compile(self, node):
+        return compiled(self)(node)
 
     def matches(self, node):
         # return whether the selector matches an element
@@ -13,8 +29,17 @@ class TagSelector:
 
 class DescendantSelector:
     def __init__(self, base_selectors):
-        self.base_selectors = base_selectors
-        self.priority = sum(selector.priority for selector in base_selectors)
+        self.base_selectors = tuple(base_selectors)
+        self.priority = sum([selector.priority for selector in self.base_selectors])
+        self.matches = self.compile
+
+    @cached_property
+    def ancestor_masks(self):
+        # matches() only succeeds if one of these selectors matches an ancestor of the node
+        return tuple(key_mask(hash(rightmost(selector).key)) for selector in self.base_selectors)
+
+    def compile(self, node):
+        return compiled(self)(node)
 
     def matches(self, node):
         descendant = self.base_selectors[-1]
@@ -28,10 +53,122 @@ class DescendantSelector:
     
 
 class ClassSelector:
+    ancestor_masks = ()
+
     def __init__(self, cls):
         self.cls = cls
         self.priority = 10
+        self.key = "." + cls
+        self.matches = self.compile
+
+    def compile(self, node):
+        return compiled(self)(node)
 
     def matches(self, node):
         if isinstance(node, Element) and "class" in node.attributes.keys():
             return self.cls == node.attributes["class"]
+
+
+def rightmost(selector):
+    # the simple selector that has to match the node itself
+    while isinstance(selector, DescendantSelector):
+        selector = selector.base_selectors[-1]
+    return selector
+
+
+def compiled(selector):
+    # the selector's matches closure, compiled now if the selector has not matched anything yet
+    if selector.matches == selector.compile:
+        if isinstance(selector, TagSelector):
+            selector.matches = compile_tag(selector.tag)
+        elif isinstance(selector, ClassSelector):
+            selector.matches = compile_class(selector.cls)
+        else:
+            selector.matches = compile_descendant(selector.base_selectors)
+    return selector.matches
+
+
+def compile_now(selector):
+    # compile a selector before it is shared between threads, so matching only ever reads it
+    compiled(selector)
+    if isinstance(selector, DescendantSelector):
+        selector.ancestor_masks
+
+
+# Element has no subclasses and Text nodes have no tag or attributes, so the exact class test
+# stands in for isinstance; a class selector compares the whole class attribute, like matches()
+def compile_tag(tag):
+    def matches(node):
+        return node.__class__ is Element and node.tag == tag
+    return matches
+
+
+def compile_class(cls):
+    def matches(node):
+        return node.__class__ is Element and node.attributes.get("class") == cls
+    return matches
+
+
+def compile_descendant(base_selectors):
+    # the node has to match the last selector, and then its parent the last selector again,
+    # its grandparent the one before, and so on, for as many ancestors as there are selectors
+    if len(base_selectors) == 2 and not any(isinstance(base, DescendantSelector) for base in base_selectors):
+        return compile_pair(*base_selectors)
+    last = compiled(base_selectors[-1])
+    checks = tuple(compiled(selector) for selector in reversed(base_selectors))
+
+    def matches(node):
+        if not last(node):
+            return False
+        for check in checks:
+            node = node.parent
+            if not node:
+                return False
+            if check(node):
+                return True
+        return False
+    return matches
+
+
+def compile_pair(ancestor, descendant):
+    # "a b", by far the most common shape, with every test inlined;
+    # parents are always elements, since text nodes have no children
+    if isinstance(ancestor, TagSelector):
+        ancestor_attribute, ancestor_value = "tag", ancestor.tag
+    else:
+        ancestor_attribute, ancestor_value = "class", ancestor.cls
+    if isinstance(descendant, TagSelector):
+        tag = descendant.tag
+
+        def matches(node):
+            if node.__class__ is not Element or node.tag != tag:
+                return False
+            parent = node.parent
+            if not parent:
+                return False
+            if parent.tag == tag:
+                return True
+            grandparent = parent.parent
+            if not grandparent:
+                return False
+            if ancestor_attribute == "tag":
+                return grandparent.tag == ancestor_value
+            return grandparent.attributes.get("class") == ancestor_value
+        return matches
+    cls = descendant.cls
+
+    def matches(node):
+        if node.__class__ is not Element or node.attributes.get("class") != cls:
+            return False
+        parent = node.parent
+        if not parent:
+            return False
+        if parent.attributes.get("class") == cls:
+            return True
+        grandparent = parent.parent
+        if not grandparent:
+            return False
+        if ancestor_attribute == "tag":
+            return grandparent.tag == ancestor_value
+        return grandparent.attributes.get("class") == ancestor_value
+    return matches
@@ -1,6 +1,11 @@
-from CSSParser import CSSParser
+import threading
+
+from Helper.ancestor_filter import AncestorFilter
 from Helper.animation import NumericAnimation, TranslateAnimation
-from Helper.tokens import Element
+from Helper.selector import compile_now
+from Helper.style_cache import parse_style_sheet, inline_styles
+from Helper.style_sharing import StyleSharing
+from Helper.tokens import Element, DIRTY_SELF, DIRTY_DESCENDANTS, DIRTY_SUBTREE
 
 REFRESH_RATE_SEC = 0.016  # 16ms
 INHERITED_PROPERTIES = {
@@ -17,10 +22,139 @@ ANIMATED_PROPERTIES = {
     "opacity": NumericAnimation,
     "transform": TranslateAnimation,
 }
+BROWSER_STYLE_SHEET_PATH = "Sheets/browser.css"
+browser_rules = None
+browser_rules_lock = threading.Lock()
+
+
+def browser_style_sheet():
+    # the browser's style sheet is parsed once per process and shared by every tab; its selectors
+    # are compiled before the rules are published, since tabs style on their own threads
+    global browser_rules
+    with browser_rules_lock:
+        if browser_rules is None:
+            with open(BROWSER_STYLE_SHEET_PATH) as f:
+                rules = parse_style_sheet(f.read())
+            for selector, _ in rules:
+                compile_now(selector)
+            browser_rules = rules
+    return browser_rules
+
+
+def style(node, rules, tab, ancestors=None, sharing=None):
+    # ancestors holds the elements above node, filled from node's parents if not passed in
+    if ancestors is None:
+        ancestors = AncestorFilter()
+        ancestors.start(node)
+    if sharing is None:
+        sharing = StyleSharing()
+    style_node(node, rules, tab, ancestors, sharing)
+    if not node.children:
+        return
+    # apply the same to children nodes, in pre-order, with the filter holding each node's ancestors
+    ancestors.push(node)
+    parents = [node]
+    stack = [iter(node.children)]
+    while stack:
+        for child in stack[-1]:
+            style_node(child, rules, tab, ancestors, sharing)
+            if child.children:
+                # continue with child's children, and come back to the rest of this list after them
+                ancestors.push(child)
+                parents.append(child)
+                stack.append(iter(child.children))
+                break
+        else:
+            stack.pop()
+            ancestors.pop(parents.pop())
+
+
+def restyle(node, rules, tab, ancestors, sharing, changed):
+    # style the dirty parts of the tree below node, and the children of nodes whose inherited
+    # values changed; changed collects the highest nodes whose computed style changed, and every
+    # node marked dirty itself that changed, since layout keeps the blocks below a changed block
+    # whose own style is the same
+    descend, inherited_changed, covered = restyle_node(node, rules, tab, ancestors, sharing, changed, False, False)
+    if not descend:
+        return
+    ancestors.push(node)
+    # each entry holds a parent, its remaining children, and whether the children are dirty
+    # because the parent's inherited values changed, or already covered by a changed ancestor
+    stack = [(node, iter(node.children), inherited_changed, covered)]
+    while stack:
+        parent, children, parent_changed, covered = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            ancestors.pop(parent)
+            continue
+        if not parent_changed and not child.dirty:
+            continue
+        descend, inherited_changed, child_covered = restyle_node(
+            child, rules, tab, ancestors, sharing, changed, parent_changed, covered)
+        if descend:
+            ancestors.push(child)
+            stack.append((child, iter(child.children), inherited_changed, child_covered))
+
+
+def restyle_node(node, rules, tab, ancestors, sharing, changed, parent_changed, covered):
+    # returns whether node's children have to be visited, whether node's inherited values changed,
+    # and whether node or an ancestor is in changed; an ancestor only covers the changes its inherited
+    # values made, which reach every block down to the node through the blocks' styles
+    dirty = node.dirty
+    if dirty & DIRTY_SUBTREE:
+        style(node, rules, tab, ancestors, sharing)
+        changed.append(node)
+        return False, False, True
+    inherited_changed = False
+    if parent_changed or dirty & DIRTY_SELF:
+        old_style = node.style
+        style_node(node, rules, tab, ancestors, sharing)
+        new_style = node.style
+        if new_style != old_style:
+            # the node's block is laid out again, which covers what its inherited values change below it
+            if not covered or dirty & DIRTY_SELF:
+                changed.append(node)
+                covered = True
+            for prop in INHERITED_PROPERTIES:
+                if old_style.get(prop) != new_style[prop]:
+                    inherited_changed = True
+                    break
+    node.dirty = 0
+    descend = bool(node.children) and bool(inherited_changed or dirty & DIRTY_DESCENDANTS)
+    return descend, inherited_changed, covered
 
 
-def style(node, rules, tab):
+def style_node(node, rules, tab, ancestors, sharing):
     old_style = node.style
+    node.dirty = 0
+    # nodes with the same style inputs share one computed style
+    key = sharing.key(node)
+    shared_style = sharing.get(key)
+    if shared_style is None:
+        cascade(node, rules, ancestors)
+        shared_style = sharing.intern(node.style)
+        sharing.put(key, shared_style)
+    node.style = shared_style
+    # animate every time a style value changes
+    if old_style:
+        transitions = diff_styles(old_style, node.style)
+        for prop, (old_value, new_value, num_frames) in transitions.items():
+            if prop in ANIMATED_PROPERTIES:
+                # animation frames update the style, so only a frame is needed, not another style pass
+                tab.browser.set_needs_animation_frame(tab)
+                AnimationClass = ANIMATED_PROPERTIES[prop]
+                animation = AnimationClass(old_value, new_value, num_frames)
+                node.set_animation(prop, animation)
+                if node.style is shared_style:
+                    node.style = dict(shared_style)
+                node.style[prop] = animation.animate()
+    # shared styles are read-only, so animation frames write into the animated node's own copy
+    if node.animations and node.style is shared_style:
+        node.style = dict(shared_style)
+
+
+def cascade(node, rules, ancestors):
     node.style = {}
     # inherit font properties
     for prop, default_value in INHERITED_PROPERTIES.items():
@@ -28,18 +162,29 @@ def style(node, rules, tab):
             node.style[prop] = node.parent.style[prop]
         else:
             node.style[prop] = default_value
-    # loop over all elements and all rules in order to add the property/value pairs
-    # to the element's style information
-    for selector, body in rules:
+    # loop over the rules that could match the element, in cascade order, to add
+    # the property/value pairs to the element's style information
+    ancestor_bits = ancestors.bits
+    for selector, body in rules.candidates(node):
+        # descendant selectors none of whose ancestor keys are in the filter can not match; this is
+        # the filter's only lookup, kept inline since it runs for every descendant candidate
+        if selector.ancestor_masks:
+            ancestors.checks += 1
+            for mask in selector.ancestor_masks:
+                if ancestor_bits & mask == mask:
+                    break
+            else:
+                ancestors.rejects += 1
+                continue
         if not selector.matches(node):
             continue
         for prop, value in body.items():
             computed_value = compute_style(node, prop, value)
             if not computed_value: continue
             node.style[prop] = computed_value
-    # parse style attribute to fill in the style field
+    # parse style attribute to fill in the style field, once per distinct attribute text
     if isinstance(node, Element) and "style" in node.attributes:
-        pairs = CSSParser(node.attributes["style"]).body()
+        pairs = inline_styles.parse(node.attributes["style"])
         for prop, value in pairs.items():
             computed_value = compute_style(node, prop, value)
             node.style[prop] = computed_value
@@ -52,19 +197,6 @@ def style(node, rules, tab):
         node_pct = float(node.style["font-size"][:-1]) / 100
         parent_px = float(parent_font_size[:-2])
         node.style["font-size"] = str(node_pct * parent_px) + "px"
-    # animate every time a style value changes
-    if old_style:
-        transitions = diff_styles(old_style, node.style)
-        for prop, (old_value, new_value, num_frames) in transitions.items():
-            if prop in ANIMATED_PROPERTIES:
-                tab.set_needs_render()
-                AnimationClass = ANIMATED_PROPERTIES[prop]
-                animation = AnimationClass(old_value, new_value, num_frames)
-                node.animations[prop] = animation
-                node.style[prop] = animation.animate()
-    # apply the same to children nodes
-    for child in node.children:
-        style(child, rules, tab)
 
 
 def compute_style(node, prop, value):
@@ -88,19 +220,6 @@ def compute_style(node, prop, value):
         return value
 
 
-def tree_to_list(tree, array):
-    array.append(tree)
-    for child in tree.children:
-        tree_to_list(child, array)
-    return array
-
-
-def add_parent_pointers(nodes, parent=None):
-    for node in nodes:
-        node.parent = parent
-        add_parent_pointers(node.children, node)
-
-
 def parse_transition(value):
     # return a dictionary mapping property names to transition durations (frames)
     properties = {}
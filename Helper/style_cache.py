@@ -0,0 +1,192 @@
+# parsed style sheets are cached by a hash of their text, in memory and on disk,
+# so pages of the same site and later browser sessions skip parsing shared style sheets;
+# style attributes are cached in memory by their text
+import hashlib
+import marshal
+import os
+import sys
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+
+from CSSParser import CSSParser
+from Helper.selector import TagSelector, ClassSelector, DescendantSelector
+
+
+def cache_home():
+    # where the XDG base directory spec puts caches; a relative XDG_CACHE_HOME is ignored, like the spec says
+    home = os.environ.get("XDG_CACHE_HOME", "")
+    if not os.path.isabs(home):
+        home = os.path.join(os.path.expanduser("~"), ".cache")
+    return home
+
+
+STYLE_CACHE_DIR = os.path.join(cache_home(), "pandasurf", "style_sheets")
+# the least recently used files are removed once the directory is larger than this
+MAX_DISK_BYTES = 16 * 1024 * 1024
+# bump when CSSParser produces different rules for the same text
+CACHE_VERSION = 1
+# marshal's format changes between python versions
+CACHE_FORMAT = (CACHE_VERSION, sys.version_info[:2])
+MAX_MEMORY_SHEETS = 64
+MAX_INLINE_STYLES = 4096
+
+memory_cache = OrderedDict()
+lock = threading.Lock()
+# cleared when the cache directory can not be written, and then sheets are only cached in memory
+disk_cache = True
+
+
+def parse_style_sheet(text):
+    # the rules of a style sheet with read-only bodies, parsed at most once per distinct text
+    key = hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+    with lock:
+        rules = memory_cache.get(key)
+        if rules is not None:
+            memory_cache.move_to_end(key)
+            return rules
+    rules = load_rules(key)
+    if rules is None:
+        rules = freeze_rules(CSSParser(text).parse())
+        save_rules(key, rules)
+    with lock:
+        memory_cache[key] = rules
+        if len(memory_cache) > MAX_MEMORY_SHEETS:
+            memory_cache.popitem(last=False)
+    return rules
+
+
+def freeze_rules(rules):
+    # read-only bodies can be shared without copying; selectors still compile on their first match,
+    # and tabs that race to compile one assign equal closures
+    return tuple((selector, MappingProxyType(body)) for selector, body in rules)
+
+
+def cache_path(key):
+    return os.path.join(STYLE_CACHE_DIR, key + ".rules")
+
+
+def load_rules(key):
+    # a missing, unreadable or outdated cache file just means parsing again
+    path = cache_path(key)
+    try:
+        with open(path, "rb") as f:
+            version, rules = marshal.loads(f.read())
+        if version != CACHE_FORMAT:
+            return None
+        rules = tuple((decode_selector(selector), MappingProxyType(dict(body)))
+                      for selector, body in rules)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    # the modification time orders the files by their last use, for prune_cache
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return rules
+
+
+def save_rules(key, rules):
+    global disk_cache
+    if not disk_cache:
+        return
+    data = (CACHE_FORMAT, tuple((encode_selector(selector), tuple(body.items()))
+                                for selector, body in rules))
+    path = cache_path(key)
+    # write to a temporary file first so readers never see half a file
+    temp_path = "{}.{}.{}".format(path, os.getpid(), threading.get_ident())
+    try:
+        os.makedirs(STYLE_CACHE_DIR, exist_ok=True)
+        with open(temp_path, "wb") as f:
+            f.write(marshal.dumps(data))
+        os.replace(temp_path, path)
+    except OSError:
+        # a read-only, full or missing cache directory is not tried again for every sheet
+        disk_cache = False
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        return
+    prune_cache()
+
+
+def prune_cache():
+    # remove the least recently used files of a directory over MAX_DISK_BYTES, down to three quarters of it,
+    # so pruning does not run again on every save
+    files = []
+    try:
+        with os.scandir(STYLE_CACHE_DIR) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError:
+        return
+    total = sum(size for _, size, _ in files)
+    if total <= MAX_DISK_BYTES:
+        return
+    files.sort()
+    for _, size, path in files:
+        if total <= MAX_DISK_BYTES * 3 // 4:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+
+
+# selectors are stored as nested tuples of plain values
+def encode_selector(selector):
+    if isinstance(selector, TagSelector):
+        return 0, selector.tag
+    if isinstance(selector, ClassSelector):
+        return 1, selector.cls
+    return 2, tuple(encode_selector(base) for base in selector.base_selectors)
+
+
+def decode_selector(data):
+    kind, value = data
+    if kind == 0:
+        return TagSelector(value)
+    if kind == 1:
+        return ClassSelector(value)
+    if kind == 2:
+        return DescendantSelector([decode_selector(base) for base in value])
+    raise ValueError("unknown selector kind " + str(kind))
+
+
+class InlineStyleCache:
+    # one read-only declaration dict per distinct style attribute text, shared by every node and tab;
+    # a changed attribute is a different key, so entries never go stale and old ones age out
+    def __init__(self, size):
+        self.size = size
+        self.styles = OrderedDict()
+        self.lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+
+    def parse(self, text):
+        with self.lock:
+            self.lookups += 1
+            pairs = self.styles.get(text)
+            if pairs is not None:
+                self.hits += 1
+                self.styles.move_to_end(text)
+                return pairs
+        pairs = MappingProxyType(CSSParser(text).body())
+        with self.lock:
+            self.styles[text] = pairs
+            if len(self.styles) > self.size:
+                self.styles.popitem(last=False)
+        return pairs
+
+    def text(self):
+        if not self.lookups:
+            return ""
+        return "Inline style cache: {} of {} style attributes reused a parse ({:.0f}%), {} cached".format(
+            self.hits, self.lookups, self.hits / self.lookups * 100, len(self.styles))
+
+
+inline_styles = InlineStyleCache(MAX_INLINE_STYLES)
@@ -0,0 +1,76 @@
+# computed styles shared between nodes whose style inputs are identical, so long runs of similar
+# siblings, like list items, table rows and the text inside them, run the cascade once;
+# the styles the cascade computes are interned, so nodes anywhere in the page with equal styles
+# hold one read-only mapping
+import sys
+from types import MappingProxyType
+
+from Helper.tokens import Element
+
+MAX_INTERNED_STYLES = 4096
+
+
+class StyleSharing:
+    def __init__(self):
+        self.styles = {}
+        # a number for each distinct key of the pass, and the numbers of the elements styled with them
+        self.keys = {}
+        self.tokens = {}
+        # computed styles by their items, kept across style passes
+        self.interned = {}
+        # nodes looked up, how many reused a style, and the bytes of the styles they did not allocate
+        self.lookups = 0
+        self.hits = 0
+        self.saved_bytes = 0
+
+    def start(self):
+        # keys hold tokens of this pass's nodes, so entries only live for one style pass
+        self.styles = {}
+        self.tokens = {}
+        self.keys = {}
+
+    def key(self, node):
+        # a node's style only depends on its parent's style, its tag, class and style attribute,
+        # and on its ancestors' tags and classes; the parent stands in for all of that by the token
+        # of its own key, since interned styles are shared by parents whose ancestors differ
+        parent = node.parent
+        # a parent not styled in this pass has no token, and then only its own children share
+        parent_token = self.tokens.get(parent, parent) if parent is not None else None
+        if isinstance(node, Element):
+            attributes = node.attributes
+            key = parent_token, node.tag, attributes.get("class"), attributes.get("style")
+            self.tokens[node] = self.keys.setdefault(key, len(self.keys))
+            return key
+        return parent_token,
+
+    def get(self, key):
+        self.lookups += 1
+        style = self.styles.get(key)
+        if style is None:
+            return None
+        self.hits += 1
+        self.saved_bytes += sys.getsizeof(style)
+        return style
+
+    def put(self, key, style):
+        self.styles[key] = style
+
+    def intern(self, style):
+        # the read-only style equal to style; writers copy it first
+        items = tuple(style.items())
+        interned = self.interned.get(items)
+        if interned is None:
+            if len(self.interned) >= MAX_INTERNED_STYLES:
+                self.interned = {}
+            interned = MappingProxyType(style)
+            self.interned[items] = interned
+        else:
+            self.saved_bytes += sys.getsizeof(style)
+        return interned
+
+    def text(self):
+        if not self.lookups:
+            return ""
+        return ("Style sharing: {} of {} nodes reused a computed style ({:.0f}%), "
+                "{} distinct styles, {:.0f} KB not kept").format(
+            self.hits, self.lookups, self.hits / self.lookups * 100, len(self.interned), self.saved_bytes / 1024)
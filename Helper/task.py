@@ -1,6 +1,9 @@
 # all work the browser has to do can be turned into a task
 import threading
 
+from Helper.font_manager import fonts, text_widths
+from Helper.style_cache import inline_styles
+
 
 class Task:
     def __init__(self, task_code, *args):
@@ -14,6 +17,12 @@ class Task:
         self.args = None
 
 
+def print_stats(text):
+    # caches and filters have no text if they were never used
+    if text:
+        print(text)
+
+
 # tasks can be created and run at some later time via the TaskRunner
 class TaskRunner:
     def __init__(self, tab):
@@ -45,6 +54,13 @@ class TaskRunner:
 
     def handle_quit(self):
         print(self.tab.measure_render.text())
+        print_stats(inline_styles.text())
+        print_stats(self.tab.preload.text())
+        print_stats(self.tab.ancestor_filter.text())
+        print_stats(self.tab.style_sharing.text())
+        print_stats(fonts.text())
+        print_stats(text_widths.text())
+        self.tab.preload.close()
 
     def run(self):
         while True:
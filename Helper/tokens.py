@@ -1,15 +1,50 @@
+import sys
+from types import MappingProxyType
+
+# shared read-only placeholders, replaced by real containers the first time a node writes to them
+NO_CHILDREN = ()
+NO_ATTRIBUTES = MappingProxyType({})
+NO_STYLE = MappingProxyType({})
+NO_ANIMATIONS = MappingProxyType({})
+# style invalidation bits: the node's own style, some node below it, or its whole subtree is out of date
+DIRTY_SELF = 1
+DIRTY_DESCENDANTS = 2
+DIRTY_SUBTREE = 4
+
+
 class Token:
-    pass
+    __slots__ = ("children", "parent", "style", "animations", "save_layer", "dirty")
+
+    def append_child(self, child):
+        if self.children is NO_CHILDREN:
+            self.children = []
+        self.children.append(child)
+
+    def set_animation(self, prop, animation):
+        if self.animations is NO_ANIMATIONS:
+            self.animations = {}
+        self.animations[prop] = animation
+
+    def mark_dirty(self, bits):
+        # ancestors only record that something below them is dirty, and stop at the first one that knows
+        self.dirty |= bits
+        parent = self.parent
+        while parent and not parent.dirty & DIRTY_DESCENDANTS:
+            parent.dirty |= DIRTY_DESCENDANTS
+            parent = parent.parent
 
 
 class Text(Token):
+    __slots__ = ("text",)
+
     def __init__(self, text, parent):
         self.text = text
-        self.children = []
+        self.children = NO_CHILDREN
         self.parent = parent
 
-        self.style = {}
-        self.animations = {}
+        self.style = NO_STYLE
+        self.animations = NO_ANIMATIONS
+        self.dirty = 0
 
     def __repr__(self):
         return repr(self.text)
@@ -19,14 +54,22 @@ class Text(Token):
 
 
 class Element(Token):
+    __slots__ = ("tag", "attributes")
+
     def __init__(self, tag, attributes, parent):
-        self.tag = tag
-        self.attributes = attributes
-        self.children = []
+        self.tag = sys.intern(tag)
+        self.attributes = attributes if attributes else NO_ATTRIBUTES
+        self.children = NO_CHILDREN
         self.parent = parent
 
-        self.style = {}
-        self.animations = {}
+        self.style = NO_STYLE
+        self.animations = NO_ANIMATIONS
+        self.dirty = 0
+
+    def set_attribute(self, name, value):
+        if self.attributes is NO_ATTRIBUTES:
+            self.attributes = {}
+        self.attributes[name] = value
 
     def __repr__(self):
         return "<" + self.tag + ">"
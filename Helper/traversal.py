@@ -0,0 +1,43 @@
+# walks over the DOM, layout and display list trees, which all keep their children in .children
+# every walk is iterative, so deeply nested pages do not run into the recursion limit
+
+
+def walk(tree):
+    # the nodes of tree in pre-order
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        yield node
+        children = node.children
+        if children:
+            stack.extend(reversed(children))
+
+
+def tree_to_list(tree, array):
+    array.extend(walk(tree))
+    return array
+
+
+def add_parent_pointers(nodes, parent=None):
+    stack = [(node, parent) for node in reversed(nodes)]
+    while stack:
+        node, parent = stack.pop()
+        node.parent = parent
+        stack.extend((child, node) for child in reversed(node.children))
+
+
+class TreeList:
+    # the pre-order list of a tree, built on first use and kept until the tree is replaced
+    # or invalidate() is called after it changed
+    def __init__(self):
+        self.root = None
+        self.nodes = None
+
+    def get(self, root):
+        if self.nodes is None or self.root is not root:
+            self.root = root
+            self.nodes = list(walk(root))
+        return self.nodes
+
+    def invalidate(self):
+        self.nodes = None
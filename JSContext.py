@@ -1,11 +1,12 @@
 import threading
 import time
+from functools import lru_cache
 
 import dukpy
 
 from CSSParser import CSSParser
 from HTMLParser import HTMLParser
-from Helper.style import tree_to_list
+from Helper.selector import TagSelector, ClassSelector, rightmost
 from Helper.task import Task
 from Requests.request import resolve_url, url_origin, RequestHandler
 
@@ -42,12 +43,21 @@ class JSContext:
             print("Script", script, "crashed", e)
 
     def query_selector_all(self, selector_text):
-        # find all nodes matching a selector
-        selector = CSSParser(selector_text).selector()
-        nodes = [node for node
-                 in tree_to_list(self.tab.nodes, [])
-                 if selector.matches(node)]
-        return [self.get_handle(node) for node in nodes]
+        # find all nodes matching a selector, testing only the elements with its rightmost tag or class
+        selector = compile_selector(selector_text)
+        if not selector:
+            return []
+        index = self.tab.dom_index()
+        key = rightmost(selector)
+        if isinstance(key, TagSelector):
+            candidates = index.tag(key.tag)
+        elif isinstance(key, ClassSelector):
+            candidates = index.cls(key.cls)
+        else:
+            return []
+        if key is not selector:
+            candidates = [node for node in candidates if selector.matches(node)]
+        return [self.get_handle(node) for node in candidates]
 
     def get_handle(self, elt):
         # create a new handle if one doesn't exist yet
@@ -64,15 +74,13 @@ class JSContext:
         return elt.attributes.get(attr, None)
 
     def innerHTML_set(self, handle, s):
-        # parse the HTML string
-        doc = HTMLParser("<html><body>" + s + "</body></html>").parse()
-        new_nodes = doc.children[0].children
-        # extract all children of the body element
+        # parse the HTML string directly into the element
         elt = self.handle_to_node[handle]
-        elt.children = new_nodes
-        for child in elt.children:
-            child.parent = elt
-        self.tab.set_needs_render()
+        old_children = elt.children
+        HTMLParser(s).parse_fragment(elt)
+        self.tab.dom_index().replace_children(elt, old_children)
+        # only the element's subtree has to be styled and laid out again
+        self.tab.set_needs_subtree_render(elt)
 
     def XMLHttpRequest_send(self, method, url, body, isasync, handle):
         # resolve the url and do security checks
@@ -126,6 +134,12 @@ class JSContext:
     def style_set(self, handle, s):
         # support changing an element’s style attribute from JavaScript
         elt = self.handle_to_node[handle]
-        elt.attributes["style"] = s
-        # make sure browser rerenders the page
-        self.tab.set_needs_render()
+        elt.set_attribute("style", s)
+        # only the element, and the children that inherit from it, have to be styled again
+        self.tab.set_needs_style(elt)
+
+
+@lru_cache(maxsize=256)
+def compile_selector(selector_text):
+    # scripts tend to run the same few queries over and over
+    return CSSParser(selector_text).selector()
@@ -1,13 +1,16 @@
 # Web pages are constructed out of blocks (headings, paragraphs, and menus) that are stacked
 # vertically one after another
+import math
+
 import skia
 
-from Helper.font_manager import get_font
+from Helper.font_manager import get_font, measure_text, word_widths
 from Layouts.input_layout import InputLayout
 from Layouts.line_layout import LineLayout
 from Layouts.text_layout import TextLayout
 from Helper.draw import DrawRect, DrawRRect, paint_visual_effects
 from Helper.tokens import Text, Element
+from Helper.traversal import walk
 
 FONTS = {}
 INPUT_WIDTH_PX = 200
@@ -40,54 +43,141 @@ class BlockLayout:
         self.center_line = False
         self.font_delta = 0
         self.previous_word = None
+        # the block is kept between layouts and only laid out again when it is dirty, something below
+        # it is, or its constraints changed: the parent's width, the font delta and the node's style
+        self.dirty = True
+        self.dirty_descendants = False
+        self.constraints = None
+        self.mode = None
+        # the nodes an inline block laid out, each followed by its style, to check after a full style pass
+        self.content = None
+        # child blocks below the layout limit, taken out of children until the layout gets to them
+        self.pending_blocks = None
 
     def layout_intermediate(self):
-        # reads from HTML to tree and writes to Layout tree
+        # reads from HTML to tree and writes to Layout tree, keeping the blocks of nodes that were already laid out
+        old = {child.node: child for child in self.children}
+        self.children = []
         previous = None
         for child in self.node.children:
-            inter = BlockLayout(child, self, previous)
+            inter = old.get(child)
+            if inter is None:
+                inter = BlockLayout(child, self, previous)
+            else:
+                inter.previous = previous
             self.children.append(inter)
             previous = inter
 
-    def layout(self, font_delta):
+    def layout(self, font_delta, check=False, limit=math.inf):
+        # lay out this block and the blocks below it in pre-order, finishing each block's height
+        # once its children are done, without recursing into them; blocks that can be reused are
+        # only moved, and check compares every kept block's content with its nodes; returns where
+        # the layout stopped when it got to a block below limit, or None once everything is done
+        if not self.start_layout(font_delta, check):
+            return None
+        return layout_blocks([(self, iter(self.children))], font_delta, check, limit)
+
+    def start_layout(self, font_delta, check=False):
+        # returns whether the block's children have to be visited, False when the block was kept as it was
+        if self.pending_blocks is not None:
+            self.children.extend(self.pending_blocks)
+            self.pending_blocks = None
+        y = self.start_y()
+        constraints = (self.parent.width, font_delta, self.node.style)
+        if not self.dirty and self.constraints == constraints and (not check or self.same_content()):
+            if not self.dirty_descendants and not (check and self.mode == "block"):
+                # nothing inside the block changed, so it only moves with the blocks before it
+                if y != self.y:
+                    shift_y(self, y - self.y)
+                return False
+            # keep the child blocks, and visit them for the ones that changed
+            self.y = y
+            self.dirty_descendants = False
+            return True
+        self.dirty = False
+        self.dirty_descendants = False
+        self.constraints = constraints
         self.font_delta = font_delta
         # set up width
         width = self.node.style.get('width')
         self.width = to_pixel(width) if (width != "auto" and width is not None) else self.parent.width
         # start attributes relative to parent attributes
         self.x = self.parent.x
-        if self.previous:
-            self.y = self.previous.y + self.previous.height
-        else:
-            self.y = self.parent.y
+        self.y = y
         # layout block depending on its type
-        mode = layout_mode(self.node)
-        if mode == "block":
+        self.mode = layout_mode(self.node)
+        if self.mode == "block":
+            self.content = None
             self.layout_intermediate()
         else:
+            self.children = []
+            self.center_line = False
+            self.previous_word = None
             self.new_line()
             self.recurse(self.node)
-        # recursively call layout on each child
-        for child in self.children:
-            child.layout(font_delta)
-            # self.style_sheet += child.style_sheet
+            self.content = inline_content(self.node)
+        return True
+
+    def start_y(self):
+        if self.previous:
+            return self.previous.y + self.previous.height
+        return self.parent.y
+
+    def reusable(self, font_delta, check):
+        # whether start_layout would only move the block, which is cheap enough to do past the layout limit
+        return (not self.dirty and not self.dirty_descendants and not check and self.pending_blocks is None
+                and self.constraints == (self.parent.width, font_delta, self.node.style))
+
+    def finish_layout(self):
         height = self.node.style.get('height')
         if height == "auto" or height is None:
             # height of the block should be the sum of its children heights
             self.height = sum([child.height for child in self.children])
+            if self.pending_blocks and self.children:
+                # blocks not laid out yet are guessed to be as tall as the ones before them
+                self.height += self.height / len(self.children) * len(self.pending_blocks)
         else:
             # set height to dimension specified by container
             self.height = to_pixel(height)
 
+    def same_content(self):
+        # whether the nodes the block laid out are still there, in the same order and with the same styles
+        if layout_mode(self.node) != self.mode:
+            return False
+        if self.mode == "block":
+            children = self.node.children
+            if len(children) != len(self.children):
+                return False
+            for block, child in zip(self.children, children):
+                if block.node is not child:
+                    return False
+            return True
+        content = self.content
+        i = 0
+        for node in walk(self.node):
+            if i == len(content) or content[i] is not node or content[i + 1] is not node.style:
+                return False
+            i += 2
+        return i == len(content)
+
+    def mark_dirty(self):
+        # lay out the block again next time, and visit the blocks above it on the way there
+        self.dirty = True
+        parent = self.parent
+        while isinstance(parent, BlockLayout) and not parent.dirty_descendants:
+            parent.dirty_descendants = True
+            parent = parent.parent
+
     def text(self, node):
         def add_to_line(the_word, word_width):
             line = self.children[-1]
-            text = TextLayout(node, the_word, line, self.previous_word, pre_tag, node.style["in-bullet"])
+            text = TextLayout(node, the_word, line, self.previous_word, pre_tag, node.style["in-bullet"],
+                              font, word_width)
             line.children.append(text)
             self.previous_word = text
             self.cursor_x += word_width
             if not pre_tag:
-                self.cursor_x += font.measureText(" ")
+                self.cursor_x += space
 
         # calculate pre-tag
         pre_tag = to_bool(node.style["in-pre-tag"])
@@ -97,20 +187,20 @@ class BlockLayout:
             self.center_line = False
         # style properties and the words list t use
         font = get_font(node, self.font_delta)
+        space = font.space_width
         words = construct_words(node, pre_tag)
-        # find positions for all the words in the list
-        for word in words:
+        # find positions for all the words in the list, measured together up front
+        for word, w in zip(words, word_widths(font, words)):
             # add words to lines
-            w = font.measureText(word)
             if self.cursor_x + w > self.width:
                 first_word, second_word = self.hyphenate_word(word, font)
                 if first_word == "":  # no need to hyphenate
                     self.new_line(self.center_line)
                 else:
                     # add the first word to this line, go to next line, add second word to next line
-                    add_to_line(first_word, font.measureText(first_word))
+                    add_to_line(first_word, measure_text(font, first_word))
                     self.new_line(self.center_line)
-                    add_to_line(second_word, font.measureText(second_word))
+                    add_to_line(second_word, measure_text(font, second_word))
                     continue
             elif pre_tag and word == "\n":
                 self.new_line()
@@ -133,16 +223,19 @@ class BlockLayout:
         line.children.append(input_area)
         self.previous_word = input_area
         font = get_font(node, self.font_delta)
-        self.cursor_x += w + font.measureText(" ")
+        self.cursor_x += w + font.space_width
 
     def recurse(self, node):
-        if isinstance(node, Text):
-            if to_bool(node.style["show-contents"]):
-                self.text(node)
-        else:
-            self.handle_tags(node)
-            for child in node.children:
-                self.recurse(child)
+        # the inline content of node, in document order
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Text):
+                if to_bool(node.style["show-contents"]):
+                    self.text(node)
+            else:
+                self.handle_tags(node)
+                stack.extend(reversed(node.children))
 
     def handle_tags(self, node):
         if node.tag == "br" or node.tag == "p":
@@ -167,13 +260,28 @@ class BlockLayout:
         #         self.style_sheet.append(node.attributes["href"])
 
     def paint(self, display_list):
+        # paint this block and the blocks below it without recursing; each block's commands
+        # are wrapped in its visual effects once its children have painted into them
+        stack = [(self, self.start_paint(display_list), iter(self.children), display_list)]
+        while stack:
+            block, cmds, children, parent_cmds = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                block.finish_paint(cmds, parent_cmds)
+            elif isinstance(child, BlockLayout):
+                stack.append((child, child.start_paint(cmds), iter(child.children), cmds))
+            else:
+                child.paint(cmds)
+
+    def start_paint(self, display_list):
+        # returns the list the block's children paint into
         cmds = []
-        rect = skia.Rect.MakeLTRB(self.x, self.y, self.x + self.width, self.y + self.height)
+        rect = self.rect()
         # browser can consult element for styling information
         bgcolor = self.node.style.get("background-color", "transparent")
         # draw background as long as it's not an input layout wrapped in a block layout
-        is_atomic = not isinstance(self.node, Text) and (self.node.tag == "input" or self.node.tag == "button")
-        if not is_atomic:
+        if not self.is_atomic():
             if bgcolor != "transparent":
                 radius = float(self.node.style.get("border-radius", "0px")[:-2])
                 cmds.append(DrawRRect(rect, radius, bgcolor))
@@ -187,13 +295,20 @@ class BlockLayout:
             x2, y2 = self.x + 10, self.y + self.height / 2 + 5
             bullet = DrawRect(self.x + 5, self.y + self.height / 2, x2, y2, "black")
             display_list.append(bullet)
-        # apply the following for the node's children
-        for child in self.children:
-            child.paint(cmds)
-        if not is_atomic:
-            cmds = paint_visual_effects(self.node, cmds, rect)
+        return cmds
+
+    def finish_paint(self, cmds, display_list):
+        # wrap the block's commands in the node's visual effects
+        if not self.is_atomic():
+            cmds = paint_visual_effects(self.node, cmds, self.rect())
         display_list.extend(cmds)
 
+    def rect(self):
+        return skia.Rect.MakeLTRB(self.x, self.y, self.x + self.width, self.y + self.height)
+
+    def is_atomic(self):
+        return not isinstance(self.node, Text) and (self.node.tag == "input" or self.node.tag == "button")
+
     def hyphenate_word(self, word, word_font):
         # find soft hyphen positions
         hyphen_positions = []
@@ -205,7 +320,7 @@ class BlockLayout:
         second_part = word
         for pos in hyphen_positions:
             first_word = word[:pos] + '-'
-            fw_width = word_font.measureText(first_word)
+            fw_width = measure_text(word_font, first_word)
             if self.cursor_x + fw_width < self.width:
                 first_part = first_word
                 second_part = word[pos + 1:]
@@ -214,6 +329,71 @@ class BlockLayout:
         return first_part, second_part
 
 
+def layout_blocks(stack, font_delta, check, limit):
+    # continue the layout of the blocks on stack, each with the iterator of its children left to visit
+    while stack:
+        block, children = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            block.finish_layout()
+        elif isinstance(child, BlockLayout):
+            if child.start_y() > limit and not child.reusable(font_delta, check):
+                stop_layout(stack, child)
+                return stack, child
+            if child.start_layout(font_delta, check):
+                stack.append((child, iter(child.children)))
+        else:
+            child.layout(font_delta)
+    return None
+
+
+def stop_layout(stack, child):
+    # set child and the blocks after it aside, in its parent and in every block above, and finish the
+    # blocks on stack with the height of what is left guessed, to be continued by resume_layout
+    i = stack[-1][0].children.index(child)
+    for depth in range(len(stack) - 1, -1, -1):
+        block, _ = stack[depth]
+        block.pending_blocks = block.children[i:]
+        del block.children[i:]
+        if depth:
+            # the parent's blocks after the one in progress
+            i = stack[depth - 1][0].children.index(block) + 1
+    for block, _ in reversed(stack):
+        block.finish_layout()
+        # visit the block again on the next layout from the top, which puts its pending blocks back
+        block.dirty_descendants = True
+
+
+def resume_layout(frontier, font_delta, check, limit):
+    # carry on with a layout where stop_layout left it, up to the new limit
+    stack, child = frontier
+    for block, _ in stack:
+        block.children.extend(block.pending_blocks)
+        block.pending_blocks = None
+        block.dirty_descendants = False
+    block, _ = stack[-1]
+    stack[-1] = (block, iter(block.children[block.children.index(child):]))
+    return layout_blocks(stack, font_delta, check, limit)
+
+
+def inline_content(node):
+    # the nodes below node, each followed by its current style
+    content = []
+    for node in walk(node):
+        content.append(node)
+        content.append(node.style)
+    return content
+
+
+def shift_y(box, dy):
+    stack = [box]
+    while stack:
+        obj = stack.pop()
+        obj.y += dy
+        stack.extend(obj.children)
+
+
 def layout_mode(node):
     if isinstance(node, Text):
         return "inline"
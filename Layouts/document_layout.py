@@ -1,4 +1,6 @@
-from Layouts.block_layout import BlockLayout
+import math
+from Layouts.block_layout import BlockLayout, resume_layout
+from Layouts.line_layout import LineLayout
 
 
 # Acts as the root of Block Layout
@@ -20,16 +22,30 @@ class DocumentLayout:
         self.y = None
         self.height = None
         self.style_sheets = []
+        # a layout stops at the first block below its limit that has to be laid out; the rest of the
+        # page is laid out later from where it stopped, with its height guessed until then
+        self.frontier = None
+        self.limit = math.inf
+        self.font_delta = 0
+        self.check = False
 
     # create the child layout objects, and then recursively their layout methods
-    def layout(self, window_width, font_delta, total_url):
-        child = BlockLayout(self.node, self, None)
-        self.children.append(child)
+    # the tree is kept between calls, so only the blocks that changed are laid out again
+    def layout(self, window_width, font_delta, total_url, check=False, limit=math.inf):
+        if not self.children:
+            self.children.append(BlockLayout(self.node, self, None))
+        child = self.children[0]
         # set attributes such that there is padding around content
         self.width = window_width - 2 * self.HSTEP
         self.x = self.HSTEP
         self.y = self.VSTEP
-        child.layout(font_delta)
+        self.font_delta = font_delta
+        # blocks a stopped layout did not get to still have to be checked when it is continued
+        self.check = check or (self.check and self.frontier is not None)
+        self.limit = limit
+        self.frontier = child.layout(font_delta, self.check, limit)
+        if self.frontier is None:
+            self.check = False
         self.height = child.height + 2 * self.VSTEP
         # self.style_sheets = child.style_sheet
         # rq = RequestHandler()
@@ -39,5 +55,77 @@ class DocumentLayout:
         #         file.write(body)
         #         file.write("\n")
 
+    # continue a layout that stopped above limit, returns whether anything was laid out
+    def layout_more(self, limit=math.inf):
+        if self.frontier is None or limit <= self.limit:
+            return False
+        self.limit = limit
+        self.frontier = resume_layout(self.frontier, self.font_delta, self.check, limit)
+        if self.frontier is None:
+            self.check = False
+        self.height = self.children[0].height + 2 * self.VSTEP
+        return True
+
+    # lay out the block holding node again on the next layout, and the blocks after it are moved
+    def mark_dirty(self, node):
+        block = self.find_block(node)
+        if not block:
+            return
+        block.mark_dirty()
+        # the parent's layout mode and child blocks depend on the node of a block
+        if block.node is node and isinstance(block.parent, BlockLayout):
+            block.parent.mark_dirty()
+
+    # continue a stopped layout until the block of node is laid out, returns whether anything was laid out
+    def layout_to(self, node):
+        laid_out = False
+        while self.frontier is not None and not self.find_block(node, pending=False):
+            # each step as far down again as the layout already got, so the steps add up to linear time
+            self.layout_more(2 * self.limit + self.VSTEP)
+            laid_out = True
+        return laid_out
+
+    def find_block(self, node, pending=True):
+        # inline elements are laid out by the closest block above them, which is found by
+        # following node's ancestors down the block tree instead of visiting every block;
+        # without pending, a node in the part of the page the layout did not get to has no block
+        path = []
+        while node:
+            path.append(node)
+            node = node.parent
+        if not self.children or self.children[0].node is not path[-1]:
+            return None
+        block = self.children[0]
+        for node in reversed(path[:-1]):
+            child = find_child(block.children, node)
+            if child is None and block.pending_blocks:
+                child = find_child(block.pending_blocks, node)
+                if child is not None and not pending:
+                    return None
+            if child is None:
+                break
+            block = child
+        return block
+
+    def find_layout(self, node):
+        # the last layout object of node, an input box or the node's own block
+        block = self.find_block(node)
+        if not block:
+            return None
+        found = block if block.node is node else None
+        for line in block.children:
+            if isinstance(line, LineLayout):
+                for obj in line.children:
+                    if obj.node is node:
+                        found = obj
+        return found
+
     def paint(self, display_list):
         self.children[0].paint(display_list)
+
+
+def find_child(blocks, node):
+    for child in blocks:
+        if isinstance(child, BlockLayout) and child.node is node:
+            return child
+    return None
@@ -1,6 +1,6 @@
 import skia
 
-from Helper.font_manager import get_font, linespace
+from Helper.font_manager import get_font
 from Helper.draw import DrawRect, DrawText, DrawRRect, paint_visual_effects
 from Helper.tokens import Text
 
@@ -25,14 +25,14 @@ class InputLayout:
         width = self.node.style.get('width')
         self.width = to_pixel(width) if (width != "auto" and width is not None) else INPUT_WIDTH_PX
         if self.previous:
-            space = self.previous.font.measureText(" ")
+            space = self.previous.font.space_width
             self.x = self.previous.x + space + self.previous.width
         else:
             self.x = self.parent.x
         # set up height
         height = self.node.style.get('height')
         if height == "auto" or height is None:
-            self.height = linespace(self.font)
+            self.height = self.font.linespace
         else:
             self.height = to_pixel(height)
 
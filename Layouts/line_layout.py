@@ -1,3 +1,4 @@
+from Helper.font_manager import word_widths
 from Layouts.text_layout import TextLayout
 
 
@@ -34,29 +35,23 @@ class LineLayout:
         if self.center_line:
             first_char_pos = self.children[0].x
             last_word_info = self.children[len(self.children) - 1]
-            last_char_pos = last_word_info.x + last_word_info.font.measureText(last_word_info.word)
+            last_char_pos = last_word_info.x + last_word_info.width
             line_length = last_char_pos - first_char_pos
         # calculate metrics to figure out the tallest word and where to put each word relative to the line
-        max_ascent = max([-word.font.getMetrics().fAscent for word in self.children])
+        max_ascent = max([-word.font.ascent for word in self.children])
         baseline = self.y + 1.25 * max_ascent
         passed_words = []
         for word in self.children:
             if self.center_line:
-                passed = find_passed(passed_words)
-                word.x = self.x + (self.width - line_length) / 2 + word.font.measureText(passed)
-            word.y = baseline + word.font.getMetrics().fAscent
+                # the words before this one and a space after each, in this word's font
+                passed = sum(word_widths(word.font, passed_words)) + len(passed_words) * word.font.space_width
+                word.x = self.x + (self.width - line_length) / 2 + passed
+            word.y = baseline + word.font.ascent
             if isinstance(word, TextLayout):
                 passed_words.append(word.word)
-        max_descent = max([word.font.getMetrics().fDescent for word in self.children])
+        max_descent = max([word.font.descent for word in self.children])
         self.height = 1.25 * (max_ascent + max_descent)
 
     def paint(self, display_list):
         for child in self.children:
             child.paint(display_list)
-
-
-def find_passed(passed):
-    s = ""
-    for word in passed:
-        s += word + " "
-    return s
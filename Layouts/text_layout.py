@@ -1,11 +1,11 @@
-from Helper.font_manager import get_font, linespace
+from Helper.font_manager import get_font, measure_text
 from Helper.draw import DrawText
 
 FONTS = {}
 
 
 class TextLayout:
-    def __init__(self, node, word, parent, previous, in_pre_tag=False, in_bullet=False):
+    def __init__(self, node, word, parent, previous, in_pre_tag=False, in_bullet=False, font=None, width=None):
         self.node = node
         self.word = word
         self.children = []
@@ -14,29 +14,31 @@ class TextLayout:
         # position and word details
         self.x = None
         self.y = None
-        self.width = None
+        # the block measures its words with their font when it breaks them into lines
+        self.width = width
         self.height = None
-        self.font = None
+        self.font = font
         self.in_pre_tag = in_pre_tag
         self.in_bullet = in_bullet
         self.font_delta = None
 
     def layout(self, font_delta):
         self.font_delta = font_delta
-        self.font = get_font(self.node, self.font_delta)
-        # compute word’s size and x position
+        if self.font is None:
+            self.font = get_font(self.node, self.font_delta)
+            # compute word’s size and x position
+            self.width = measure_text(self.font, self.word)
         # stack words left to write based on computed position
-        self.width = self.font.measureText(self.word)
         if self.previous:
             self.x = self.previous.x + self.previous.width
             if not self.in_pre_tag:
-                space = self.previous.font.measureText(" ")
+                space = self.previous.font.space_width
                 self.x += space
         else:
             self.x = self.parent.x
             if self.in_bullet:
-                self.x += 10 + self.font.measureText(" ")
-        self.height = linespace(self.font)
+                self.x += 10 + self.font.space_width
+        self.height = self.font.linespace
 
     def paint(self, display_list):
         color = self.node.style["color"]
@@ -20,7 +20,8 @@ class Cache:
         self.storage[address.url] = address
 
     def delete_address(self, url):
-        del self.storage[url]
+        # preload downloads use the cache from their own threads, so another one may have deleted it
+        self.storage.pop(url, None)
 
     def __str__(self):
         stored_urls = "{"
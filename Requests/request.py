@@ -10,6 +10,7 @@ from Requests.cache import Cache
 from Requests.header import Header
 
 COOKIE_JAR = {}
+READ_SIZE = 16384
 
 
 class RequestHandler:
@@ -17,9 +18,10 @@ class RequestHandler:
     def __init__(self):
         self.url_cache = Cache()
 
-    def request(self, url: str, top_level_url, header_list: list[Header] = None, payload=None) -> (str, str):
+    def request(self, url: str, top_level_url, header_list: list[Header] = None, payload=None,
+                on_chunk=None, on_headers=None) -> (str, str):
 
-        def parse_url(address):
+        def parse_url(address, on_chunk=None, on_headers=None):
             # separate the host from the path
             host, path = address.split("/", 1)
             path = "/" + path
@@ -120,32 +122,15 @@ class RequestHandler:
                     s.close()
                     if new_url.startswith('/'):
                         new_url = host + new_url
-                        return parse_url(new_url)
+                        return parse_url(new_url, on_chunk, on_headers)
                     else:
-                        return self.request(new_url, top_level_url)
+                        return self.request(new_url, top_level_url, on_chunk=on_chunk, on_headers=on_headers)
                 else:
                     raise ValueError
-            # check for transfer encoding
-            if 'transfer-encoding' in headers and headers['transfer-encoding'] == 'chunked':
-                chunks = []
-                chunk_length = 10
-                while chunk_length > 0:
-                    line = response.readline().decode('utf8')
-                    line.replace('\r\n', '')
-                    chunk_length = int(line, 16)
-                    chunk = response.read(chunk_length)
-                    chunks.append(chunk)
-                    response.readline()
-                body = b''.join(chunks)
-            else:
-                body = response.read()
-            # check for content encoding - decompress and then decode
-            if 'content-encoding' in headers and headers['content-encoding'] == 'gzip':
-                body = zlib.decompressobj(32).decompress(body)
-            try:
-                body = body.decode('utf8')
-            except UnicodeDecodeError:
-                body = body.decode('iso-8859-1')
+            # let the caller act on the headers before the body arrives
+            if on_headers:
+                on_headers(headers)
+            body = read_body(response, headers, on_chunk)
             s.close()
             # Add Caching support
             if 'cache-control' in headers:
@@ -190,7 +175,7 @@ class RequestHandler:
                     else:
                         self.url_cache.delete_address(url)
                 # If not in cache, proceed normally
-                return parse_url(url)
+                return parse_url(url, on_chunk, on_headers)
             case "file":
                 url = url[2:]
                 return parse_file(url)
@@ -204,6 +189,54 @@ class RequestHandler:
                 return url_headers, new_html_body
 
 
+def read_body(response, headers, on_chunk=None):
+    # decompress and decode the body piece by piece
+    # on_chunk receives the decoded text as it comes off the socket
+    decompressor = None
+    if 'content-encoding' in headers and headers['content-encoding'] == 'gzip':
+        decompressor = zlib.decompressobj(32)
+    decoder = codecs.getincrementaldecoder('utf8')()
+    pieces = []
+
+    def receive(data):
+        nonlocal on_chunk
+        if decompressor:
+            data = decompressor.decompress(data)
+        pieces.append(data)
+        if on_chunk and data:
+            try:
+                text = decoder.decode(data)
+            except UnicodeDecodeError:
+                # the whole body will be decoded as iso-8859-1, stop streaming
+                on_chunk = None
+                return
+            if text:
+                on_chunk(text)
+
+    # check for transfer encoding
+    if 'transfer-encoding' in headers and headers['transfer-encoding'] == 'chunked':
+        chunk_length = 10
+        while chunk_length > 0:
+            line = response.readline().decode('utf8')
+            chunk_length = int(line, 16)
+            receive(response.read(chunk_length))
+            response.readline()
+    else:
+        while True:
+            data = response.read1(READ_SIZE)
+            if not data:
+                break
+            receive(data)
+    if decompressor:
+        pieces.append(decompressor.flush())
+    body = b''.join(pieces)
+    try:
+        body = body.decode('utf8')
+    except UnicodeDecodeError:
+        body = body.decode('iso-8859-1')
+    return body
+
+
 def parse_file(path):
     with open(path, 'r') as file:
         # Read the contents of the file
@@ -7,9 +7,11 @@ import skia
 
 from Helper.draw import draw_line, draw_text, draw_rect, DrawRect, DrawCompositedLayer, SaveLayer, absolute_bounds, \
     CompositedLayer
+from Helper.font_manager import get_cached_font
 from Helper.measure_time import MeasureTime
-from Helper.style import tree_to_list, add_parent_pointers
+from Helper.style import browser_style_sheet
 from Helper.task import Task
+from Helper.traversal import tree_to_list, add_parent_pointers
 from tab import Tab
 
 REFRESH_RATE_SEC = 0.016  # 16ms
@@ -87,11 +89,16 @@ class Browser:
         self.needs_raster = False
         self.needs_draw = False
         self.measure_composite_raster_and_draw = MeasureTime("composite-raster-and-draw")
+        # parse the browser's style sheet up front so opening a tab never has to
+        browser_style_sheet()
         # information for commit
         self.lock = threading.Lock()
         self.url = None
         self.scroll = 0
         self.active_tab_height = 0
+        # the tab's document height, which guesses the part of a long page that is not laid out yet;
+        # the scroll range and the scrollbar follow it, so they move by however far off the guess was as idle layout replaces it
+        self.active_tab_document_height = 0
         self.active_tab_display_list = None
         # copy the data to an SDL surface
         if sdl2.SDL_BYTEORDER == sdl2.SDL_BIG_ENDIAN:
@@ -133,7 +140,7 @@ class Browser:
         canvas.clear(skia.ColorWHITE)
         # draw chrome elements
         draw_rect(canvas, 0, 0, self.WIDTH, self.CHROME_PX, fill_color="white")
-        button_font = skia.Font(skia.Typeface('Helvetica'), 20)
+        button_font = get_cached_font("Helvetica", 20, "normal", "roman")
         self.draw_tabs(canvas, button_font)
         self.draw_address_bar(canvas, button_font)
         self.draw_navigation_buttons(canvas)
@@ -166,7 +173,7 @@ class Browser:
 
     def draw_tabs(self, canvas, button_font):
         # tabs
-        tabfont = skia.Font(skia.Typeface('Helvetica'), 20)
+        tabfont = get_cached_font("Helvetica", 20, "normal", "roman")
         for i, tab in enumerate(self.tabs):
             # 40 pixels tall, 80 pixels wide
             name = "Tab {}".format(i)
@@ -451,6 +458,7 @@ class Browser:
             if data.scroll is not None:
                 self.scroll = data.scroll
             self.active_tab_height = data.height
+            self.active_tab_document_height = data.height
             if data.display_list:
                 self.active_tab_display_list = data.display_list
             self.animation_timer = None
@@ -517,7 +525,9 @@ class Browser:
             if not did_break:
                 layer = CompositedLayer(self.skia_context, cmd)
                 self.composited_layers.append(layer)
-        self.active_tab_height = 0
+        # the display list only covers the laid out part of the page, so scrolling is bounded by the document's
+        # height, guess included; the tab lays out whatever is scrolled to before it is painted
+        self.active_tab_height = self.active_tab_document_height
         for layer in self.composited_layers:
             self.active_tab_height = max(self.active_tab_height, layer.absolute_bounds().bottom())
 
@@ -1,12 +1,16 @@
 import math
 import os
+import time
 import urllib.parse
 
 import skia
 
-from CSSParser import CSSParser
 from HTMLParser import HTMLParser
+from Helper.ancestor_filter import AncestorFilter
+from Helper.dom_index import DOMIndex
 from Helper.measure_time import MeasureTime
+from Helper.preload import PreloadScanner
+from Helper.rule_index import RuleIndex
 from Helper.task import TaskRunner, Task, CommitData, SingleThreadedTaskRunner
 from JSContext import JSContext
 from Layouts.document_layout import DocumentLayout
@@ -14,8 +18,16 @@ from Layouts.input_layout import InputLayout
 from Requests.header import Header
 from Requests.request import resolve_url, RequestHandler, url_origin
 from Helper.draw import DrawLine, absolute_bounds_for_obj
-from Helper.style import style, tree_to_list
-from Helper.tokens import Text, Element
+from Helper.font_manager import measure_text
+from Helper.style import style, restyle, browser_style_sheet
+from Helper.style_cache import parse_style_sheet
+from Helper.style_sharing import StyleSharing
+from Helper.tokens import Text, Element, DIRTY_SELF, DIRTY_SUBTREE
+from Helper.traversal import TreeList, walk
+
+PROGRESSIVE_RENDER_SEC = 0.1  # 100ms
+# the page is laid out this many window heights past the bottom of the window before it is shown
+LAYOUT_AHEAD_SCREENS = 1
 
 
 class Tab:
@@ -41,8 +53,24 @@ class Tab:
         self.future = []
         self.bookmarks = bookmarks
         self.focus = None
+        # the page's rules in cascade order, indexed by tag and class, and added to as style sheets load
         self.rules = None
+        # tags and classes above the node being styled, reused by every style pass
+        self.ancestor_filter = AncestorFilter()
+        # computed styles reused by nodes with the same style inputs
+        self.style_sharing = StyleSharing()
         self.js = None
+        # elements of self.nodes by tag, class and id, built the first time a script or anchor needs it
+        self.dom = None
+        # pre-order lists of the DOM and layout trees, kept until the trees change
+        self.node_list = TreeList()
+        self.layout_list = TreeList()
+        # streaming parse of the page being loaded
+        self.parser = None
+        self.parsed_length = 0
+        self.loading_url = None
+        self.last_partial_render = 0
+        self.preload = PreloadScanner(self.rq, self.allowed_request)
         # what has changed
         self.browser = browser
         self.allowed_origins = None
@@ -50,6 +78,11 @@ class Tab:
         self.needs_style = False
         self.needs_layout = False
         self.needs_paint = False
+        # a full style pass does not say which nodes changed, so the next layout checks every kept block
+        self.check_layout = False
+        # how far down idle layout tasks have asked the rest of a long page to be laid out
+        self.layout_reach = 0
+        self.idle_layout_scheduled = False
         # start tasks
         if browser.single_threaded:
             self.task_runner = SingleThreadedTaskRunner(self)
@@ -57,15 +90,22 @@ class Tab:
             self.task_runner = TaskRunner(self)
         self.task_runner.start_thread()
         self.measure_render = MeasureTime("render")
-        # store browser's style sheet
-        with open("Sheets/browser.css") as f:
-            self.default_style_sheet = CSSParser(f.read()).parse()
+        # browser's style sheet, shared with the other tabs
+        self.default_style_sheet = browser_style_sheet()
 
     def load(self, url: str = None, payload=None):
         self.scroll = 0
         # reset pages and tasks
         self.scroll_changed_in_tab = True
         self.task_runner.clear_pending_tasks()
+        self.idle_layout_scheduled = False
+        self.focus = None
+        # parse the page as it arrives
+        self.parser = HTMLParser("")
+        self.parsed_length = 0
+        self.loading_url = url
+        self.last_partial_render = time.time()
+        self.preload.start(url)
         # create headers
         user_agent_header = Header("User-Agent", "This is the PandaSurf Browser.")
         accept_encoding_header = Header("Accept-Encoding", "gzip")
@@ -83,17 +123,13 @@ class Tab:
                 self.url = "about:bookmarks"
                 self.history.append("about:bookmarks")
             else:
-                headers, body = self.rq.request(url, self.url, header_list, payload)
+                headers, body = self.rq.request(url, self.url, header_list, payload,
+                                                self.receive_chunk, self.receive_headers)
                 self.url = url
                 self.history.append(url)
-                # extract and parse content of Content-Security-Policy header
-                self.allowed_origins = None
-                if "content-security-policy" in headers:
-                    csp = headers["content-security-policy"].split()
-                    if len(csp) > 0 and csp[0] == "default-src":
-                        self.allowed_origins = csp[1:]
+                self.receive_headers(headers)
 
-            self.nodes = HTMLParser(body).parse()
+            self.nodes = self.finish_parse(body)
             self.js = JSContext(self)
             # self.form_doc_layout()
             # if os.path.getsize("external.css") != 0:
@@ -118,10 +154,48 @@ class Tab:
             self.nodes = HTMLParser(body).parse()
             self.reload_document()
 
+    def receive_headers(self, headers):
+        # extract and parse content of Content-Security-Policy header
+        self.allowed_origins = None
+        if "content-security-policy" in headers:
+            csp = headers["content-security-policy"].split()
+            if len(csp) > 0 and csp[0] == "default-src":
+                self.allowed_origins = csp[1:]
+
+    def receive_chunk(self, chunk):
+        # start subresource downloads before the parser reaches their tags
+        self.preload.feed(chunk)
+        self.parser.feed(chunk)
+        self.parsed_length += len(chunk)
+        # show the top of the page while the rest is still downloading
+        if time.time() - self.last_partial_render >= PROGRESSIVE_RENDER_SEC:
+            self.render_partial()
+
+    def finish_parse(self, body):
+        # the streamed text is not the body if it was never streamed or decoding fell back
+        if self.parsed_length != len(body):
+            self.preload.feed(body)
+            return HTMLParser(body).parse()
+        return self.parser.close()
+
+    def render_partial(self):
+        self.last_partial_render = time.time()
+        self.nodes = self.parser.partial_tree()
+        if not self.nodes:
+            return
+        # the partial tree keeps its root while it grows
+        self.node_list.invalidate()
+        self.dom = None
+        # linked style sheets and scripts are only loaded once the whole page is parsed
+        self.rules = RuleIndex(self.default_style_sheet)
+        self.needs_style = True
+        self.render()
+        self.commit(self.loading_url, True)
+
     def reload_document(self):
         # find all the scripts
         scripts = [node.attributes["src"] for node
-                   in tree_to_list(self.nodes, [])
+                   in self.node_list.get(self.nodes)
                    if isinstance(node, Element)
                    and node.tag == "script"
                    and "src" in node.attributes]
@@ -132,14 +206,14 @@ class Tab:
             if not self.allowed_request(script_url):
                 print("Blocked script", script, "due to CSP")
                 continue
-            header, body = self.rq.request(script_url, self.url)
+            header, body = self.fetch_subresource(script_url)
             task = Task(self.js.run, script_url, body)
             self.task_runner.schedule_task(task)
-        # copy rules
-        self.rules = self.default_style_sheet.copy()
+        # start from the shared browser rules
+        self.rules = RuleIndex(self.default_style_sheet)
         # grab the URL of each linked style sheet
         links = [node.attributes["href"]
-                 for node in tree_to_list(self.nodes, [])
+                 for node in self.node_list.get(self.nodes)
                  if isinstance(node, Element)
                  and node.tag == "link"
                  and "href" in node.attributes
@@ -151,42 +225,113 @@ class Tab:
                 print("Blocked style", link, "due to CSP")
                 continue
             try:
-                header, body = self.rq.request(style_url, self.url)
+                header, body = self.fetch_subresource(style_url)
             except:
                 # ignores style sheets that fail to download
                 continue
-            self.rules.extend(CSSParser(body).parse())
+            # style sheets shared between pages are only parsed once
+            self.rules.add(parse_style_sheet(body))
         self.set_needs_render()
 
+    def fetch_subresource(self, url):
+        # use the preload scanner's download if it already started one
+        response = self.preload.take(url)
+        if response is None:
+            response = self.rq.request(url, self.url)
+        return response
+
     def render(self):
         self.measure_render.start_timing()
         # redo the styling, layout, paint and draw phases
+        self.render_style()
+        self.render_layout()
+        self.render_paint()
+        self.measure_render.stop_timing()
+
+    def render_style(self):
         # apply style in cascading order
         if self.needs_style:
-            style(self.nodes, sorted(self.rules, key=cascade_priority), self)
+            self.ancestor_filter.start(self.nodes)
+            self.style_sharing.start()
+            style(self.nodes, self.rules, self, self.ancestor_filter, self.style_sharing)
             self.needs_layout = True
+            self.check_layout = True
             self.needs_style = False
+        elif self.nodes.dirty:
+            self.render_dirty_nodes()
+
+    def render_layout(self):
         # compute the layout to be displayed in the browser
         if self.needs_layout:
-            self.document = DocumentLayout(self.nodes)
-            self.document.layout(self.WIDTH, self.font_delta, self.url)
+            # the layout tree is kept while the page is the same, and only its changed blocks are laid out again
+            if not self.document or self.document.node is not self.nodes:
+                self.document = DocumentLayout(self.nodes)
+                self.layout_reach = 0
+            self.document.layout(self.WIDTH, self.font_delta, self.url, self.check_layout, self.layout_limit())
+            self.layout_list.invalidate()
             self.needs_paint = True
             self.needs_layout = False
+            self.check_layout = False
+        elif self.needs_more_layout():
+            # scrolled, or an idle task asked, past the part of the page laid out so far
+            self.document.layout_more(self.layout_limit())
+            self.layout_list.invalidate()
+            self.needs_paint = True
+        if self.document and self.document.frontier is not None:
+            if not self.idle_layout_scheduled:
+                self.idle_layout_scheduled = True
+                self.task_runner.schedule_task(Task(self.layout_idle))
+        else:
+            # the whole page is laid out, so the next layout from the top stops below the window again
+            self.layout_reach = 0
+
+    def layout_limit(self):
+        # only the blocks down to here are laid out, so the first frame of a long page is as fast as a short one's
+        return max(self.scroll + (1 + LAYOUT_AHEAD_SCREENS) * self.HEIGHT, self.layout_reach)
+
+    def needs_more_layout(self):
+        return (self.document is not None and self.document.frontier is not None
+                and self.layout_limit() > self.document.limit)
+
+    def layout_idle(self):
+        # lay out the rest of the page a part at a time once the tasks before this one ran, each
+        # part as far down again as everything before it, so the whole page still takes linear time
+        self.idle_layout_scheduled = False
+        if not self.document or self.document.frontier is None:
+            return
+        self.layout_reach = 2 * max(self.layout_limit(), self.document.limit)
+        self.browser.set_needs_animation_frame(self)
+
+    def render_paint(self):
         # check if screen needs to be redrawn
         if self.needs_paint:
             self.display_list = []
             self.document.paint(self.display_list)
-            # draw cursor if necessary
+            # draw cursor if necessary, unless the focused input is below the part of the page laid out so far
             if self.focus:
-                obj = [obj for obj in tree_to_list(self.document, [])
-                       if obj.node == self.focus and
-                       isinstance(obj, InputLayout)][0]
-                text = self.focus.attributes.get("value", "")
-                x = obj.x + obj.font.measureText(text)
-                y = obj.y
-                self.display_list.append(DrawLine(x, y, x, y + obj.height))
+                objs = [obj for obj in self.layout_list.get(self.document)
+                        if obj.node == self.focus and isinstance(obj, InputLayout)]
+                if objs:
+                    obj = objs[0]
+                    text = self.focus.attributes.get("value", "")
+                    x = obj.x + measure_text(obj.font, text)
+                    y = obj.y
+                    self.display_list.append(DrawLine(x, y, x, y + obj.height))
             self.needs_paint = False
-        self.measure_render.stop_timing()
+
+    def render_dirty_nodes(self):
+        # only the nodes marked dirty, and the children of nodes whose inherited values changed
+        changed = []
+        self.ancestor_filter.start(self.nodes)
+        self.style_sharing.start()
+        restyle(self.nodes, self.rules, self, self.ancestor_filter, self.style_sharing, changed)
+        if changed:
+            # the blocks of the changed nodes are laid out again, and the blocks after them moved
+            if self.document:
+                for node in changed:
+                    self.document.mark_dirty(node)
+            self.needs_layout = True
+        self.needs_paint = True
 
     def configure(self, width, height):
         if self.WIDTH != 1 and self.HEIGHT != 1:
@@ -201,7 +346,7 @@ class Tab:
         y += self.scroll
         # what elements are at the location
         loc_rect = skia.Rect.MakeXYWH(x, y, 1, 1)
-        objs = [obj for obj in tree_to_list(self.document, [])
+        objs = [obj for obj in self.layout_list.get(self.document)
                 if absolute_bounds_for_obj(obj).intersects(loc_rect)]
         # which object is closest to the top
         if not objs: return
@@ -224,7 +369,7 @@ class Tab:
                     self.load(url)
                     return
             elif elt.tag == "input":
-                elt.attributes["value"] = ""
+                elt.set_attribute("value", "")
                 if elt != self.focus:
                     self.set_needs_render()
                 self.focus = elt
@@ -239,18 +384,26 @@ class Tab:
             elt = elt.parent
 
     def find_location(self, identify):
-        identify = identify[1:]
-        last_x, last_y = None, None
-        for obj in tree_to_list(self.document, []):
-            if isinstance(obj.node, Element) and "id" in obj.node.attributes:
-                if obj.node.attributes["id"] == identify:
-                    last_x, last_y = obj.x, obj.y
-        return last_x, last_y
+        node = self.dom_index().element_by_id(identify[1:])
+        # the page is laid out down to the target, and the rest of it is left to the idle layout
+        if node and self.document.layout_to(node):
+            self.layout_list.invalidate()
+            self.set_needs_paint()
+        obj = self.document.find_layout(node) if node else None
+        if not obj:
+            return None, None
+        return obj.x, obj.y
+
+    def dom_index(self):
+        # a new page, or a new partial tree while loading, gets a new index
+        if self.dom is None or self.dom.root is not self.nodes:
+            self.dom = DOMIndex(self.nodes)
+        return self.dom
 
     def submit_form(self, elt):
         if self.js.dispatch_event("submit", elt): return
         # look through the descendants of the form to find input elements
-        inputs = [node for node in tree_to_list(elt, [])
+        inputs = [node for node in walk(elt)
                   if isinstance(node, Element)
                   and node.tag == "input"
                   and "name" in node.attributes]
@@ -272,17 +425,17 @@ class Tab:
         match key:
             case '+':
                 self.font_delta += 1
-                self.set_needs_render()
+                self.set_needs_layout()
             case '-':
                 if self.font_delta > -10:
                     self.font_delta -= 1
-                    self.set_needs_render()
+                    self.set_needs_layout()
 
     def keypress(self, char):
         if self.focus:
             if self.js.dispatch_event("keydown", self.focus): return
-            self.focus.attributes["value"] += char
-            self.set_needs_render()
+            self.focus.set_attribute("value", self.focus.attributes["value"] + char)
+            self.set_needs_style(self.focus)
 
     def go_back(self):
         if len(self.history) > 1:
@@ -320,7 +473,18 @@ class Tab:
         self.needs_style = True
         self.browser.set_needs_animation_frame(self)
 
-    def set_needs_layout(self):
+    def set_needs_style(self, node, dirty=DIRTY_SELF):
+        node.mark_dirty(dirty)
+        self.browser.set_needs_animation_frame(self)
+
+    def set_needs_subtree_render(self, node):
+        self.node_list.invalidate()
+        self.set_needs_style(node, DIRTY_SUBTREE)
+
+    def set_needs_layout(self, node=None):
+        # node's block is laid out again, or only the blocks whose constraints changed if there is no node
+        if node and self.document:
+            self.document.mark_dirty(node)
         self.needs_layout = True
         self.browser.set_needs_animation_frame(self)
 
@@ -333,7 +497,7 @@ class Tab:
             self.scroll = scroll
         self.js.interp.evaljs("__runRAFHandlers()")
         #  during an animation, run layout and paint, but not style
-        for node in tree_to_list(self.nodes, []):
+        for node in self.node_list.get(self.nodes):
             for (property_name, animation) in node.animations.items():
                 value = animation.animate()
                 if value:
@@ -342,9 +506,13 @@ class Tab:
                         self.composited_updates.append(node)
                         self.set_needs_paint()
                     else:
-                        self.set_needs_layout()
-        needs_composite = self.needs_style or self.needs_layout
+                        self.set_needs_layout(node)
+        needs_composite = (self.needs_style or self.needs_layout or bool(self.nodes.dirty)
+                           or self.needs_more_layout())
         self.render()
+        self.commit(self.url, needs_composite)
+
+    def commit(self, url, needs_composite):
         # set scroll_changed_in_tab when loading a new page or when
         # browser thread’s scroll offset is past the bottom of page
         document_height = math.ceil(self.document.height)
@@ -363,7 +531,7 @@ class Tab:
                 composited_updates[node] = node.save_layer
         self.composited_updates = []
         # commit data
-        commit_data = CommitData(self.url, scroll, document_height, self.display_list, composited_updates,)
+        commit_data = CommitData(url, scroll, document_height, self.display_list, composited_updates,)
         self.display_list = None
         self.scroll_changed_in_tab = False
         self.browser.commit(self, commit_data)
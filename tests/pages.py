@@ -0,0 +1,27 @@
+# tabs rendered without a browser window, for tests that drive the render pipeline
+from HTMLParser import HTMLParser
+from Helper.rule_index import RuleIndex
+from JSContext import JSContext
+from tab import Tab
+
+
+class HeadlessBrowser:
+    # the tab runs its tasks when asked to and nothing is shown
+    single_threaded = True
+
+    def set_needs_animation_frame(self, tab):
+        pass
+
+    def commit(self, tab, data):
+        pass
+
+
+def rendered_tab(html, url="http://example.com/"):
+    tab = Tab(HeadlessBrowser(), [])
+    tab.url = url
+    tab.nodes = HTMLParser(html).parse()
+    tab.js = JSContext(tab)
+    tab.rules = RuleIndex(tab.default_style_sheet)
+    tab.needs_style = True
+    tab.render()
+    return tab
@@ -0,0 +1,40 @@
+import unittest
+
+from CSSParser import CSSParser
+
+
+def rule_bodies(text):
+    return [(selector.key, body) for selector, body in CSSParser(text).parse()]
+
+
+class InlineStyleTest(unittest.TestCase):
+    def test_leading_whitespace(self):
+        # the first declaration used to be dropped when the value started with whitespace
+        self.assertEqual(CSSParser("  color: red").body(), {"color": "red"})
+        self.assertEqual(CSSParser("\n\tcolor: red; Font-Size: 2px").body(), {"color": "red", "font-size": "2px"})
+
+    def test_quoted_values_are_skipped(self):
+        self.assertEqual(CSSParser("font-family: 'a;b'; color: red").body(), {"color": "red"})
+
+
+class StyleSheetTest(unittest.TestCase):
+    def test_quoted_strings_in_blocks(self):
+        self.assertEqual(rule_bodies('p { font-family: "a}b"; color: red } div { Color: blue }'),
+                         [("p", {"color": "red"}), ("div", {"color": "blue"})])
+
+    def test_at_rules_and_stray_braces_are_skipped(self):
+        self.assertEqual(rule_bodies("@media print { p { color: red } } } b { color: blue }"),
+                         [("b", {"color": "blue"})])
+
+    def test_unterminated_rule_ends_the_sheet(self):
+        self.assertEqual(rule_bodies('b { color: blue } p { content: "x } i { color: red }'),
+                         [("b", {"color": "blue"})])
+
+    def test_repeated_selectors(self):
+        rules = CSSParser("p .a { color: red } p .a { color: blue }").parse()
+        self.assertEqual([body for _, body in rules], [{"color": "red"}, {"color": "blue"}])
+        self.assertEqual([selector.priority for selector, _ in rules], [11, 11])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+from HTMLParser import HTMLParser
+from Helper.dom_index import DOMIndex
+
+
+def inner_html(index, elt, html):
+    # what JSContext.innerHTML_set does to the tree and the index
+    old_children = elt.children
+    HTMLParser(html).parse_fragment(elt)
+    index.replace_children(elt, old_children)
+
+
+class InnerHTMLTest(unittest.TestCase):
+    def setUp(self):
+        self.root = HTMLParser("<html><body><div id=a><p>x</p></div><p id=b>y</p></body></html>").parse()
+        self.index = DOMIndex(self.root)
+
+    def test_replaced_children_are_indexed(self):
+        div = self.index.element_by_id("a")
+        inner_html(self.index, div, "<span>1</span><p>2</p>")
+        self.assertEqual([elt.parent for elt in self.index.tag("span")], [div])
+        self.assertEqual([elt.parent for elt in self.index.tag("p")], [div, div.parent])
+
+    def test_inner_html_on_detached_element(self):
+        div = self.index.element_by_id("a")
+        detached = div.children[0]
+        inner_html(self.index, div, "<span>1</span>")
+        inner_html(self.index, detached, "<p>z</p><b>w</b>")
+        self.assertEqual(self.index.tag("p"), [self.index.element_by_id("b")])
+        self.assertEqual(self.index.tag("b"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
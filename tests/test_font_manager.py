@@ -0,0 +1,42 @@
+import random
+import unittest
+
+from Helper.font_manager import get_cached_font, measure_text, word_widths
+
+# single characters, and words above the basic multilingual plane that skip the advance tables
+CHARACTERS = ["a", "W", " ", ".", "\N{soft hyphen}", "é", "中", "\U0001d518", "\U0001f600"]
+
+
+class WordWidthsTest(unittest.TestCase):
+    def assert_same_as_measure_text(self, font, words):
+        widths = word_widths(font, words)
+        self.assertEqual(len(widths), len(words))
+        for word, width in zip(words, widths):
+            self.assertAlmostEqual(width, measure_text(font, word), places=3, msg=(words, word))
+
+    def test_empty_words(self):
+        font = get_cached_font("Didot", 12, "normal", "roman")
+        for words in [[], [""], ["", ""], ["", "a"], ["a", ""], ["ab", "", "c", ""], ["", "", "xyz", "", ""]]:
+            self.assert_same_as_measure_text(font, words)
+        self.assertEqual(word_widths(font, ["", "a", ""])[::2], [0, 0])
+
+    def test_single_characters(self):
+        font = get_cached_font("Didot", 16, "bold", "italic")
+        self.assert_same_as_measure_text(font, CHARACTERS)
+        for character in CHARACTERS:
+            self.assert_same_as_measure_text(font, [character])
+            self.assert_same_as_measure_text(font, ["", character, ""])
+
+    def test_random_words(self):
+        rng = random.Random(1)
+        font = get_cached_font("Didot", 20, "normal", "roman")
+        for _ in range(200):
+            # mostly latin words, with an empty or non-BMP word now and then
+            alphabet = CHARACTERS if rng.random() < 0.2 else CHARACTERS[:7]
+            words = ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 6)))
+                     for _ in range(rng.randint(1, 12))]
+            self.assert_same_as_measure_text(font, words)
+
+
+if __name__ == "__main__":
+    unittest.main()
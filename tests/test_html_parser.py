@@ -0,0 +1,179 @@
+import random
+import unittest
+
+from HTMLParser import HTMLParser, check_in_script
+
+PIECES = [
+    "<", ">", "\"", "'", "<!--", "-->", "-", "!", "/", ";", " ", "\n", "a", "p", "script",
+    "<script>", "<SCRIPT>", "<script src=x>", "</script>", "<!-- x -->", "<!DOCTYPE html>",
+    "&", "&amp;", "&lt;", "&gt;", "&shy", "&quot;", "amp;", "lt;", "quot;", "shy",
+    "<p>", "</p>", "<b>", "</b>", "<li>", "<br>", "<html>", "</html>", "<head>", "</head>", "<body>",
+    "<title>", "<meta x=1>", "<div class=\"x y\">", "</div>", "<a href='q'>", "</a>",
+    "<input value=\"a>b\">", "<p title=\"&amp;&lt;\">",
+]
+
+
+class CharacterParser(HTMLParser):
+    # the character loop the boundary scanner replaced, building the tree the same way
+    def parse(self):
+        last_ten_chars = "          "
+        text = ""
+        in_tag = False
+        in_quotes = False
+        in_script = False
+        read_text = True
+        last_known_tag = False
+        for c in self.body:
+            last_ten_chars = last_ten_chars[-9:] + c
+            if c == "\"":
+                in_quotes = not in_quotes
+            if last_ten_chars[-4:] == "<!--":
+                read_text = False
+                in_tag = last_known_tag
+                last_ten_chars = "          "
+                text = text[:-2]
+            elif last_ten_chars[-3:] == "-->":
+                read_text = True
+                continue
+            if read_text:
+                if in_script:
+                    if last_ten_chars[-9:] == "</script>":
+                        text = text[:-8]
+                        if text:
+                            self.add_text(text)
+                        text = ""
+                        last_known_tag = False
+                        in_tag = False
+                        in_script = False
+                        self.add_tag("/script")
+                    else:
+                        text += c
+                else:
+                    if c == "<":
+                        last_known_tag = in_tag
+                        in_tag = True
+                        if text:
+                            self.add_text(text)
+                        text = ""
+                    elif c == ">" and not in_quotes:
+                        last_known_tag = in_tag
+                        in_tag = False
+                        self.add_tag(text)
+                        in_script = check_in_script(text)
+                        text = ""
+                    else:
+                        text += c
+                        if text[-4:] == '&lt;':
+                            text = text[:-4] + '<'
+                        elif text[-4:] == '&gt;':
+                            text = text[:-4] + '>'
+                        elif text[-4:] == '&shy':
+                            text = text[:-4] + '\N{soft hyphen}'
+                        elif text[-5:] == '&amp;':
+                            text = text[:-5] + '&'
+                        elif text[-6:] == '&quot;':
+                            text = text[:-6] + '\"'
+        if not in_tag and text:
+            self.add_text(text)
+        return self.finish()
+
+
+def dump(node):
+    # the tree in pre-order, with every node's depth
+    out = []
+    stack = [(node, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if hasattr(node, "tag"):
+            out.append((depth, node.tag, tuple(node.attributes.items())))
+        else:
+            out.append((depth, None, node.text))
+        stack.extend((child, depth + 1) for child in reversed(node.children))
+    return out
+
+
+def parsed(parser, feed=None):
+    # the tree dump, or the exception the parser raised
+    try:
+        if feed is None:
+            return dump(parser.parse())
+        return feed(parser)
+    except Exception as e:
+        return type(e).__name__
+
+
+def document(rng, pieces=40):
+    return "".join(rng.choice(PIECES) for _ in range(rng.randint(0, pieces)))
+
+
+def chunks(rng, body):
+    # body cut at random points, so markers, quotes and entities are split between chunks
+    cuts = sorted(rng.sample(range(len(body) + 1), min(len(body) + 1, rng.randint(1, 8))))
+    return [body[start:end] for start, end in zip([0] + cuts, cuts + [len(body)])]
+
+
+class ScannerTest(unittest.TestCase):
+    def test_same_trees_as_character_loop(self):
+        rng = random.Random(1)
+        for _ in range(3000):
+            body = document(rng)
+            self.assertEqual(parsed(HTMLParser(body)), parsed(CharacterParser(body)), body)
+
+    def test_known_documents(self):
+        for body in [
+            "<p>a &amp;lt; b</p>",
+            "<script>if (a < b && c > d) { x = '</p>' }</script><p>after</p>",
+            "<p>x<!-- <b>hidden</b> -->y</p>",
+            "<div title=\"a > b\">text</div>",
+            "<script>a<!--b-->c</script>",
+            "<p>a --> b</p>",
+        ]:
+            self.assertEqual(parsed(HTMLParser(body)), parsed(CharacterParser(body)), body)
+
+
+class FeedTest(unittest.TestCase):
+    def feed_all(self, parts):
+        def feed(parser):
+            for part in parts:
+                parser.feed(part)
+            return dump(parser.close())
+        return feed
+
+    def test_chunks_at_random_points(self):
+        rng = random.Random(2)
+        for _ in range(2000):
+            body = document(rng)
+            parts = chunks(rng, body)
+            self.assertEqual(parsed(HTMLParser(""), self.feed_all(parts)), parsed(CharacterParser(body)), parts)
+
+    def test_chunks_inside_markers(self):
+        body = ("<html><body><p title=\"a &quot; > b\">x &amp; y &lt; z</p>"
+                "<!-- a <p> -- > comment --><script>if (a < b) { s = \"</p>\" }</script>"
+                "<b>&shy&gt;</b></body></html>")
+        expected = parsed(CharacterParser(body))
+        for cut in range(len(body) + 1):
+            for size in (1, 2, 3):
+                parts = [body[:cut]] + [body[i:i + size] for i in range(cut, len(body), size)]
+                self.assertEqual(parsed(HTMLParser(""), self.feed_all(parts)), expected, cut)
+
+    def test_partial_trees_grow_into_the_final_tree(self):
+        # every snapshot holds complete nodes, in the order and at the depths the final tree has them
+        rng = random.Random(3)
+        for _ in range(500):
+            body = document(rng)
+            parser = HTMLParser("")
+            snapshots = []
+            try:
+                for part in chunks(rng, body):
+                    parser.feed(part)
+                    root = parser.partial_tree()
+                    snapshots.append(dump(root) if root else [])
+                final = dump(parser.close())
+            except Exception:
+                continue
+            for snapshot in snapshots:
+                self.assertEqual(snapshot, final[:len(snapshot)], body)
+
+
+if __name__ == "__main__":
+    unittest.main()
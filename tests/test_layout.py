@@ -0,0 +1,107 @@
+import random
+import unittest
+
+from Helper.tokens import Element
+from Helper.traversal import tree_to_list
+from Layouts.document_layout import DocumentLayout
+from pages import rendered_tab
+
+PAGE = "<html><body>" + "".join(
+    "<div class=c{}><p>para {} <b>bold <i>it</i></b> text words here</p>"
+    "<ul><li>one</li><li>two <span>x</span></li></ul><input value=v></div>".format(i % 3, i)
+    for i in range(12)) + "</body></html>"
+STYLES = ["color:red", "font-size:150%", "font-size:20px", "font-weight:bold", "width:300px",
+          "height:50px", "display:inline", "display:block", "", "font-style:italic"]
+INNER_HTML = ["hello <b>world</b>", "<p>a</p><p>b c d</p>", "", "x", "<div>nested <i>deep</i></div>"]
+
+
+def boxes(document):
+    # every layout object's node and box, in pre-order
+    return [(type(obj).__name__, str(obj.node), obj.x, obj.y, obj.width, obj.height, getattr(obj, "word", None))
+            for obj in tree_to_list(document, [])]
+
+
+def full_layout(tab):
+    document = DocumentLayout(tab.nodes)
+    document.layout(tab.WIDTH, tab.font_delta, tab.url)
+    return document
+
+
+class IncrementalLayoutTest(unittest.TestCase):
+    def assert_same_as_full_layout(self, tab, message):
+        # the rest of a long page is laid out first, like idle tasks would
+        tab.document.layout_more()
+        self.assertEqual(boxes(tab.document), boxes(full_layout(tab)), message)
+
+    def test_style_and_inner_html_mutations(self):
+        rng = random.Random(1)
+        for trial in range(12):
+            tab = rendered_tab(PAGE)
+            for step in range(5):
+                elements = [node for node in tree_to_list(tab.nodes, []) if isinstance(node, Element)]
+                for _ in range(rng.randint(1, 4)):
+                    handle = tab.js.get_handle(rng.choice(elements))
+                    if rng.random() < 0.65:
+                        tab.js.style_set(handle, rng.choice(STYLES))
+                    else:
+                        tab.js.innerHTML_set(handle, rng.choice(INNER_HTML))
+                tab.render()
+                self.assert_same_as_full_layout(tab, (trial, step))
+
+    def test_unchanged_content_and_font_size(self):
+        tab = rendered_tab(PAGE)
+        div = tab.dom_index().tag("div")[3]
+        # the same style and markup again leave every block as it was
+        tab.js.style_set(tab.js.get_handle(div), "color:red")
+        tab.render()
+        tab.js.style_set(tab.js.get_handle(div), "color:red")
+        tab.js.innerHTML_set(tab.js.get_handle(div), "<p>a</p>b")
+        tab.render()
+        tab.js.innerHTML_set(tab.js.get_handle(div), "<p>a</p>b")
+        tab.render()
+        self.assert_same_as_full_layout(tab, "same content")
+        # a zoom changes the constraints of every block
+        tab.font_delta += 2
+        tab.set_needs_layout()
+        tab.render()
+        self.assert_same_as_full_layout(tab, "font size")
+
+    def test_mutation_below_a_partial_layout(self):
+        tab = rendered_tab(PAGE * 4)
+        self.assertIsNotNone(tab.document.frontier)
+        last = tab.dom_index().tag("p")[-1]
+        tab.js.style_set(tab.js.get_handle(last), "font-size:30px")
+        tab.js.innerHTML_set(tab.js.get_handle(tab.dom_index().tag("div")[0]), "<p>new</p>")
+        tab.render()
+        self.assert_same_as_full_layout(tab, "partial")
+
+
+class FragmentTest(unittest.TestCase):
+    def test_layout_stops_after_the_target(self):
+        page = "<html><body>" + "".join(
+            "<div id=d{0}><p id=p{0}>para {0} <b>bold</b> words</p></div>".format(i) for i in range(400)) + "</body></html>"
+        for target in ["#d150", "#p150", "#d399"]:
+            tab = rendered_tab(page)
+            self.assertIsNotNone(tab.document.frontier)
+            x, y = tab.find_location(target)
+            # the target's position is the one a full layout gives it
+            node = tab.dom_index().element_by_id(target[1:])
+            obj = full_layout(tab).find_layout(node)
+            self.assertEqual((x, y), (obj.x, obj.y), target)
+            if target != "#d399":
+                self.assertIsNotNone(tab.document.frontier, target)
+                self.assertLess(tab.document.limit, 2 * y + 2 * tab.HEIGHT, target)
+            self.assertEqual(tab.find_location("#missing"), (None, None))
+
+    def test_layout_continues_from_the_target(self):
+        # the target is a p in the middle of the page, and the layout from there on matches a full one
+        body = PAGE[len("<html><body>"):-len("</body></html>")]
+        tab = rendered_tab("<html><body>" + body * 4 + "<p id=target>x</p>" + body * 4 + "</body></html>")
+        self.assertNotEqual(tab.find_location("#target"), (None, None))
+        self.assertIsNotNone(tab.document.frontier)
+        tab.document.layout_more()
+        self.assertEqual(boxes(tab.document), boxes(full_layout(tab)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import threading
+import unittest
+from concurrent.futures import Future
+
+import Helper.preload
+from Helper.preload import PreloadScanner, MAX_PRELOAD_WORKERS
+from pages import rendered_tab
+
+PAGE = "".join("<script src=/s{}.js></script>".format(i) for i in range(MAX_PRELOAD_WORKERS + 2))
+
+
+class BlockedRequests:
+    # requests wait until released, so downloads stay running or queued
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Semaphore(0)
+        self.urls = []
+
+    def request(self, url, top_level_url):
+        self.urls.append(url)
+        self.started.release()
+        self.release.wait()
+        return {}, "body of " + url
+
+
+class CloseTest(unittest.TestCase):
+    def test_close_drops_queued_downloads_without_waiting(self):
+        requests = BlockedRequests()
+        preload = PreloadScanner(requests, lambda url: True)
+        preload.start("http://example.com/")
+        preload.feed(PAGE)
+        fetches = list(preload.fetches.values())
+        self.assertEqual(len(fetches), MAX_PRELOAD_WORKERS + 2)
+        for _ in range(MAX_PRELOAD_WORKERS):
+            self.assertTrue(requests.started.acquire(timeout=5))
+        # returns while every worker is still blocked in a request
+        preload.close()
+        self.assertEqual(preload.fetches, {})
+        self.assertEqual(sum(fetch.cancelled() for fetch in fetches), 2)
+        self.assertIn("{} unused".format(len(fetches)), preload.text())
+        requests.release.set()
+        for fetch in fetches:
+            if not fetch.cancelled():
+                fetch.result()
+        self.assertEqual(len(requests.urls), MAX_PRELOAD_WORKERS)
+
+
+class FailingRequests:
+    def __init__(self):
+        self.urls = []
+
+    def request(self, url, top_level_url):
+        self.urls.append(url)
+        if "bad" in url:
+            raise ValueError(url)
+        return {}, "body of " + url
+
+
+class TakeTest(unittest.TestCase):
+    def test_failed_download_is_a_miss(self):
+        preload = PreloadScanner(FailingRequests(), lambda url: True)
+        preload.start("http://example.com/")
+        preload.feed("<script src=/bad.js></script><script src=/good.js></script>")
+        self.assertIsNone(preload.take("http://example.com/bad.js"))
+        self.assertEqual(preload.take("http://example.com/good.js"), ({}, "body of http://example.com/good.js"))
+        self.assertIsNone(preload.take("http://example.com/other.js"))
+        self.assertEqual((preload.hits, preload.misses), (1, 2))
+        preload.close()
+
+    def test_slow_download_is_a_miss(self):
+        requests = BlockedRequests()
+        preload = PreloadScanner(requests, lambda url: True)
+        preload.start("http://example.com/")
+        preload.feed("<script src=/slow.js></script>")
+        timeout = Helper.preload.PRELOAD_TIMEOUT_SEC
+        Helper.preload.PRELOAD_TIMEOUT_SEC = 0.01
+        try:
+            self.assertIsNone(preload.take("http://example.com/slow.js"))
+        finally:
+            Helper.preload.PRELOAD_TIMEOUT_SEC = timeout
+            requests.release.set()
+        self.assertEqual((preload.hits, preload.misses), (0, 1))
+        preload.close()
+
+    def test_tab_requests_what_failed(self):
+        tab = rendered_tab("<p>x</p>")
+        tab.rq = FailingRequests()
+        failed = Future()
+        failed.set_exception(OSError("connection reset"))
+        tab.preload.fetches["http://example.com/s.css"] = failed
+        self.assertEqual(tab.fetch_subresource("http://example.com/s.css"), ({}, "body of http://example.com/s.css"))
+        self.assertEqual(tab.rq.urls, ["http://example.com/s.css"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import random
+import unittest
+
+from CSSParser import CSSParser
+from Helper.ancestor_filter import AncestorFilter
+from Helper.selector import TagSelector, ClassSelector, DescendantSelector
+from Helper.tokens import Element, Text
+from Helper.traversal import walk
+
+TAGS = ["div", "p", "span", "li"]
+CLASSES = ["a", "b", None]
+
+
+def uncompiled(selector):
+    # a copy of selector that matches through the class's matches method, like before compilation
+    copy = object.__new__(type(selector))
+    copy.__dict__.update(selector.__dict__)
+    del copy.matches
+    if isinstance(selector, DescendantSelector):
+        copy.base_selectors = tuple(uncompiled(base) for base in selector.base_selectors)
+    return copy
+
+
+def random_tree(rng, size):
+    root = Element("html", {}, None)
+    nodes = [root]
+    for _ in range(size):
+        parent = rng.choice(nodes)
+        if rng.random() < 0.2:
+            parent.append_child(Text("t", parent))
+            continue
+        cls = rng.choice(CLASSES)
+        child = Element(rng.choice(TAGS), {"class": cls} if cls else {}, parent)
+        parent.append_child(child)
+        nodes.append(child)
+    return root
+
+
+def simple(rng):
+    if rng.random() < 0.5:
+        return TagSelector(rng.choice(TAGS))
+    return ClassSelector(rng.choice(CLASSES[:-1]))
+
+
+def random_selector(rng, depth=0):
+    r = rng.random()
+    if r < 0.3 or depth > 1:
+        return simple(rng)
+    if r < 0.7:
+        # the pair shape, compiled on its own path
+        return DescendantSelector([simple(rng), simple(rng)])
+    return DescendantSelector([random_selector(rng, depth + 1) for _ in range(rng.randint(2, 4))])
+
+
+def ancestors_of(node):
+    ancestors = AncestorFilter()
+    ancestors.start(node)
+    return ancestors
+
+
+def filter_accepts(selector, ancestors):
+    return not selector.ancestor_masks or any(ancestors.bits & mask == mask for mask in selector.ancestor_masks)
+
+
+class CompiledSelectorTest(unittest.TestCase):
+    def test_same_matches_as_uncompiled(self):
+        rng = random.Random(1)
+        for trial in range(200):
+            nodes = list(walk(random_tree(rng, 40)))
+            for _ in range(10):
+                selector = random_selector(rng)
+                generic = uncompiled(selector)
+                # selectors compile on their first match, so the first node goes through the lazy path
+                self.assertEqual(selector.matches, selector.compile)
+                rng.shuffle(nodes)
+                for node in nodes:
+                    expected = bool(generic.matches(node))
+                    self.assertEqual(bool(selector.matches(node)), expected, (trial, node))
+                    # the ancestor filter only rejects selectors that can not match
+                    if expected:
+                        self.assertTrue(filter_accepts(selector, ancestors_of(node)), (trial, node))
+                self.assertNotEqual(selector.matches, selector.compile)
+
+    def test_parsed_selectors(self):
+        rules = CSSParser("div p { color: red } .a .b { color: red } div .a { color: red } "
+                          ".a span { color: red } div p span { color: red } li { color: red } "
+                          "b { color: red }").parse()
+        rng = random.Random(2)
+        nodes = list(walk(random_tree(rng, 300)))
+        for selector, _ in rules:
+            generic = uncompiled(selector)
+            self.assertEqual([bool(selector.matches(node)) for node in nodes],
+                             [bool(generic.matches(node)) for node in nodes])
+
+    def test_parent_matching_the_last_selector(self):
+        # "div p" matches a p whose parent is a p, and looks for the div only at the grandparent
+        html = Element("html", {}, None)
+        div = Element("div", {}, html)
+        outer = Element("p", {}, div)
+        inner = Element("p", {}, outer)
+        section = Element("section", {}, div)
+        span = Element("span", {}, section)
+        deep = Element("p", {}, span)
+        for selector in DescendantSelector([TagSelector("div"), TagSelector("p")]), \
+                DescendantSelector([ClassSelector("x"), TagSelector("p")]):
+            self.assertTrue(selector.matches(inner))
+            self.assertFalse(selector.matches(deep))
+        selector = DescendantSelector([TagSelector("div"), TagSelector("p")])
+        self.assertFalse(selector.matches(outer))
+        self.assertFalse(selector.matches(Element("p", {}, None)))
+        self.assertTrue(selector.matches(Element("p", {}, section)))
+        self.assertFalse(selector.matches(span))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import random
+import threading
+import unittest
+
+import Helper.style
+from CSSParser import CSSParser
+from Helper.selector import ClassSelector, DescendantSelector
+from Helper.style import style, browser_style_sheet
+from Helper.tokens import Element, Text, DIRTY_SUBTREE
+from Helper.traversal import walk
+from pages import rendered_tab
+
+PAGE = "<html><body>" + "".join(
+    "<section class=s{0}><div class=a><p>para {0} <span>x</span> <b class=b>bold <i>it</i></b></p></div>"
+    "<ul><li class=b>one</li><li>two <span class=a>y</span></li></ul></section>".format(i % 2)
+    for i in range(6)) + "</body></html>"
+# a leading ".b" is read as a tag, and a descendant selector looks for the ancestor at the depth of its position
+SHEET = ("section p { color: red } div span { font-weight: bold } section .b { font-size: 20px } "
+         "ul .a { font-style: italic } html .s1 { color: blue }")
+STYLES = ["color:green", "font-size:150%", "font-size:10px", "font-weight:bold", "font-style:italic",
+          "display:inline", "background-color:red", ""]
+INNER_HTML = ["hello <b class=b>world</b>", "<div class=a><p>a <span>b</span></p></div>", "", "x"]
+CLASSES = ["a", "b", "s1", "s0", None]
+
+
+def clone(node, parent=None):
+    # an unstyled copy of the tree
+    if isinstance(node, Text):
+        return Text(node.text, parent)
+    copy = Element(node.tag, dict(node.attributes), parent)
+    for child in node.children:
+        copy.append_child(clone(child, copy))
+    return copy
+
+
+def styles(root):
+    return [dict(node.style) for node in walk(root)]
+
+
+def full_style(tab):
+    root = clone(tab.nodes)
+    style(root, tab.rules, tab)
+    return styles(root)
+
+
+def styled_tab(html):
+    tab = rendered_tab(html)
+    tab.rules.add(CSSParser(SHEET).parse())
+    tab.needs_style = True
+    tab.render()
+    return tab
+
+
+class RestyleTest(unittest.TestCase):
+    def test_mutations_match_a_full_style_pass(self):
+        rng = random.Random(1)
+        for trial in range(15):
+            tab = styled_tab(PAGE)
+            for step in range(5):
+                elements = [node for node in walk(tab.nodes) if isinstance(node, Element)]
+                for _ in range(rng.randint(1, 4)):
+                    elt = rng.choice(elements)
+                    r = rng.random()
+                    if r < 0.5:
+                        tab.js.style_set(tab.js.get_handle(elt), rng.choice(STYLES))
+                    elif r < 0.75:
+                        tab.js.innerHTML_set(tab.js.get_handle(elt), rng.choice(INNER_HTML))
+                    else:
+                        # descendant selectors below the element can match differently after a class change
+                        elt.set_attribute("class", rng.choice(CLASSES))
+                        tab.set_needs_style(elt, DIRTY_SUBTREE)
+                self.assertFalse(tab.needs_style)
+                tab.render_style()
+                self.assertEqual(tab.nodes.dirty, 0)
+                self.assertEqual(styles(tab.nodes), full_style(tab), (trial, step))
+
+    def test_inherited_values_reach_descendants(self):
+        tab = styled_tab(PAGE)
+        body = tab.nodes.children[0]
+        p = tab.dom_index().tag("p")[1]
+        tab.js.style_set(tab.js.get_handle(body), "font-size:30px")
+        tab.js.style_set(tab.js.get_handle(p), "font-size:12px")
+        tab.render_style()
+        self.assertEqual(styles(tab.nodes), full_style(tab))
+        # nodes without a size of their own inherit it from the closest ancestor with one
+        self.assertEqual(tab.dom_index().tag("i")[0].children[0].style["font-size"], "30px")
+        self.assertEqual(tab.dom_index().tag("ul")[0].style["font-size"], "30px")
+        self.assertEqual(p.children[0].style["font-size"], "12px")
+
+
+class AnimationTest(unittest.TestCase):
+    def test_animated_node_writes_to_its_own_copy(self):
+        tab = rendered_tab("<div class=fade>a</div><div class=fade>b</div>")
+        # transitions take more than one word, so the rules are made without the parser
+        tab.rules.add([(ClassSelector("fade"), {"opacity": "1", "transition": "opacity 0.5s"}),
+                       (ClassSelector("faded"), {"opacity": "0.2", "transition": "opacity 0.5s"})])
+        tab.needs_style = True
+        tab.render()
+        first, second = tab.dom_index().tag("div")
+        shared = second.style
+        self.assertIs(first.style, shared)
+
+        first.set_attribute("class", "faded")
+        tab.set_needs_style(first)
+        tab.render_style()
+        self.assertIn("opacity", first.animations)
+        self.assertIsNot(first.style, shared)
+        self.assertIs(second.style, shared)
+        start = first.style["opacity"]
+        tab.run_animation_frame(0)
+        self.assertNotEqual(first.style["opacity"], start)
+        self.assertEqual(shared["opacity"], "1")
+        self.assertIs(second.style, shared)
+
+        # an inherited change while the node animates restyles the copy, and leaves the shared style alone
+        body = tab.nodes.children[0]
+        tab.js.style_set(tab.js.get_handle(body), "color:red")
+        tab.render_style()
+        expected = full_style(tab)
+        for node, full in zip(walk(tab.nodes), expected):
+            if node is first:
+                self.assertEqual({k: v for k, v in node.style.items() if k != "opacity"},
+                                 {k: v for k, v in full.items() if k != "opacity"})
+            else:
+                self.assertEqual(dict(node.style), full)
+        self.assertEqual(first.style["color"], "red")
+        self.assertEqual(shared["color"], "black")
+        self.assertIsNot(first.style, second.style)
+
+
+class BrowserStyleSheetTest(unittest.TestCase):
+    def test_compiled_once_for_every_thread(self):
+        Helper.style.browser_rules = None
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(browser_style_sheet())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(rules is results[0] for rules in results))
+        for selector, _ in results[0]:
+            self.assertNotEqual(selector.matches, selector.compile)
+            if isinstance(selector, DescendantSelector):
+                self.assertIn("ancestor_masks", selector.__dict__)
+                for base in selector.base_selectors:
+                    self.assertNotEqual(base.matches, base.compile)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from Helper import style_cache
+from Helper.style_cache import parse_style_sheet, cache_home
+
+SHEET = "p {{ color: red }} .a{0} {{ font-size: 20px }} div span {{ font-weight: bold }}"
+
+
+def rule_bodies(rules):
+    return [(selector.priority, dict(body)) for selector, body in rules]
+
+
+class DiskCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.patch = mock.patch.multiple(style_cache, STYLE_CACHE_DIR=os.path.join(self.dir, "sheets"),
+                                         disk_cache=True)
+        self.patch.start()
+        style_cache.memory_cache.clear()
+
+    def tearDown(self):
+        self.patch.stop()
+        style_cache.memory_cache.clear()
+        shutil.rmtree(self.dir)
+
+    def parse_again(self, text):
+        # as a later session would, with only the disk cache left
+        style_cache.memory_cache.clear()
+        return parse_style_sheet(text)
+
+    def test_sheets_are_read_back(self):
+        text = SHEET.format(0)
+        rules = parse_style_sheet(text)
+        self.assertEqual(len(os.listdir(style_cache.STYLE_CACHE_DIR)), 1)
+        with mock.patch.object(style_cache, "CSSParser", side_effect=AssertionError):
+            self.assertEqual(rule_bodies(self.parse_again(text)), rule_bodies(rules))
+
+    def test_unwritable_directory_keeps_sheets_in_memory(self):
+        # a directory below a file can never be made
+        blocker = os.path.join(self.dir, "file")
+        open(blocker, "w").close()
+        style_cache.STYLE_CACHE_DIR = os.path.join(blocker, "sheets")
+        text = SHEET.format(1)
+        rules = parse_style_sheet(text)
+        self.assertFalse(style_cache.disk_cache)
+        self.assertIs(parse_style_sheet(text), rules)
+        self.assertEqual(rule_bodies(self.parse_again(text)), rule_bodies(rules))
+
+    def test_unreadable_file_is_parsed_again(self):
+        text = SHEET.format(2)
+        rules = parse_style_sheet(text)
+        path, = [os.path.join(style_cache.STYLE_CACHE_DIR, name) for name in os.listdir(style_cache.STYLE_CACHE_DIR)]
+        os.remove(path)
+        os.mkdir(path)
+        self.assertEqual(rule_bodies(self.parse_again(text)), rule_bodies(rules))
+        with open(path + "x", "wb") as f:
+            f.write(b"not marshal")
+        os.rmdir(path)
+        os.rename(path + "x", path)
+        self.assertEqual(rule_bodies(self.parse_again(text)), rule_bodies(rules))
+
+    def test_directory_size_is_capped(self):
+        parse_style_sheet(SHEET.format("first"))
+        size, = [os.path.getsize(os.path.join(style_cache.STYLE_CACHE_DIR, name))
+                 for name in os.listdir(style_cache.STYLE_CACHE_DIR)]
+        with mock.patch.object(style_cache, "MAX_DISK_BYTES", size * 10):
+            first = os.path.join(style_cache.STYLE_CACHE_DIR, os.listdir(style_cache.STYLE_CACHE_DIR)[0])
+            for i in range(40):
+                parse_style_sheet(SHEET.format(i + 100))
+                # the first sheet is used all the time, so it stays
+                os.utime(first, (0, 10 ** 10))
+                total = sum(os.path.getsize(os.path.join(style_cache.STYLE_CACHE_DIR, name))
+                            for name in os.listdir(style_cache.STYLE_CACHE_DIR))
+                self.assertLessEqual(total, style_cache.MAX_DISK_BYTES)
+            self.assertTrue(os.path.exists(first))
+            self.assertTrue(style_cache.disk_cache)
+
+
+class CacheHomeTest(unittest.TestCase):
+    def test_xdg_cache_home(self):
+        with mock.patch.dict(os.environ, {"XDG_CACHE_HOME": "/tmp/xdg", "HOME": "/home/u"}):
+            self.assertEqual(cache_home(), "/tmp/xdg")
+        # unset, empty or relative, the spec's default is used
+        for value in [None, "", "relative/cache"]:
+            environ = {"HOME": "/home/u"}
+            if value is not None:
+                environ["XDG_CACHE_HOME"] = value
+            with mock.patch.dict(os.environ, environ, clear=True):
+                self.assertEqual(cache_home(), "/home/u/.cache")
+
+
+if __name__ == "__main__":
+    unittest.main()
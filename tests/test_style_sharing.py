@@ -0,0 +1,140 @@
+import random
+import unittest
+
+from CSSParser import CSSParser
+from Helper.ancestor_filter import AncestorFilter, FILTER_BITS, MASK, element_hashes
+from Helper.style import style
+from Helper.style_sharing import StyleSharing
+from Helper.tokens import Element, Text
+from Helper.traversal import walk
+from pages import rendered_tab
+
+# the two sections and their paragraphs have the same tag, class and style, and only the
+# elements above them differ; "div p" looks for the div at the paragraph's grandparent
+PAGE = ("<html><body><div><section class=s><p class=p>x</p></section></div>"
+        "<article><section class=s><p class=p>y</p></section></article>"
+        "<div><section class=s><p class=p>z</p></section></div></body></html>")
+SHEET = "div p { color: red }"
+
+
+def styled_tab(html):
+    tab = rendered_tab(html)
+    tab.rules.add(CSSParser(SHEET).parse())
+    tab.needs_style = True
+    tab.render()
+    return tab
+
+
+def colliding_tag():
+    # a tag whose two filter slots are the same one, so a push counts that slot twice
+    for i in range(100000):
+        tag = "t{}".format(i)
+        h = hash(tag)
+        if h & MASK == (h >> FILTER_BITS) & MASK:
+            return tag
+
+
+def slots(node):
+    return {slot for h in element_hashes(node) for slot in (h & MASK, (h >> FILTER_BITS) & MASK)}
+
+
+class StyleSharingTest(unittest.TestCase):
+    def test_same_element_below_different_ancestors(self):
+        tab = styled_tab(PAGE)
+        first, second, third = tab.dom_index().tag("p")
+        self.assertEqual(first.style["color"], "red")
+        self.assertEqual(second.style["color"], "black")
+        self.assertEqual(third.style["color"], "red")
+        self.assertIsNot(first.style, second.style)
+        # the same ancestry shares a style again
+        self.assertIs(first.style, third.style)
+
+    def test_parents_outside_the_pass(self):
+        # nodes styled one at a time can not tell their parents' ancestors apart, so they share nothing
+        tab = styled_tab(PAGE)
+        sharing = StyleSharing()
+        sharing.start()
+        for p in tab.dom_index().tag("p"):
+            p.style = {}
+            style(p, tab.rules, tab, sharing=sharing)
+        first, second, third = tab.dom_index().tag("p")
+        self.assertEqual([p.style["color"] for p in (first, second, third)], ["red", "black", "red"])
+        self.assertEqual(sharing.hits, 0)
+
+    def test_keys_of_text_follow_their_parent(self):
+        tab = styled_tab(PAGE)
+        sharing = StyleSharing()
+        sharing.start()
+        texts = [node for node in walk(tab.nodes) if isinstance(node, Text)]
+        keys = []
+        for node in walk(tab.nodes):
+            key = sharing.key(node)
+            if isinstance(node, Text):
+                keys.append(key)
+        self.assertEqual(len(texts), 3)
+        self.assertNotEqual(keys[0], keys[1])
+        self.assertEqual(keys[0], keys[2])
+
+
+class AncestorFilterTest(unittest.TestCase):
+    def assert_empty(self, ancestors):
+        self.assertEqual(ancestors.counts, [0] * len(ancestors.counts))
+        self.assertEqual(ancestors.bits, 0)
+
+    def test_counts_return_to_zero(self):
+        tab = styled_tab(PAGE * 3)
+        ancestors = AncestorFilter()
+        style(tab.nodes, tab.rules, tab, ancestors)
+        self.assert_empty(ancestors)
+        # a pass started below the root pushes the node's parents, and pops its own subtree
+        p = tab.dom_index().tag("p")[1]
+        ancestors.start(p)
+        parents = []
+        parent = p.parent
+        while parent:
+            parents.append(parent)
+            parent = parent.parent
+        for parent in parents:
+            ancestors.pop(parent)
+        self.assert_empty(ancestors)
+
+    def test_colliding_slots(self):
+        tag = colliding_tag()
+        self.assertEqual(len(slots(Element(tag, {}, None))), 1)
+        # random nesting of elements whose keys share slots with each other and with themselves
+        rng = random.Random(1)
+        elements = [Element(tag, {}, None), Element(tag, {"class": tag}, None), Element("p", {"class": "a"}, None),
+                    Element("p", {}, None), Element("div", {"class": "p"}, None)]
+        ancestors = AncestorFilter()
+        for _ in range(200):
+            pushed = []
+            for _ in range(rng.randint(1, 30)):
+                if pushed and rng.random() < 0.4:
+                    ancestors.pop(pushed.pop())
+                else:
+                    node = rng.choice(elements)
+                    ancestors.push(node)
+                    pushed.append(node)
+                    for slot in slots(node):
+                        self.assertTrue(ancestors.bits >> slot & 1)
+            while pushed:
+                ancestors.pop(pushed.pop())
+            self.assert_empty(ancestors)
+
+    def test_slot_stays_set_while_another_key_holds_it(self):
+        tag = colliding_tag()
+        outer, inner = Element(tag, {}, None), Element(tag, {}, None)
+        slot, = slots(outer)
+        ancestors = AncestorFilter()
+        ancestors.push(outer)
+        ancestors.push(inner)
+        self.assertEqual(ancestors.counts[slot], 4)
+        ancestors.pop(inner)
+        self.assertEqual(ancestors.counts[slot], 2)
+        self.assertTrue(ancestors.bits >> slot & 1)
+        ancestors.pop(outer)
+        self.assert_empty(ancestors)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+import random
+import sys
+import unittest
+
+import skia
+
+from Helper.draw import ClipRRect, SaveLayer, Transform
+from Helper.tokens import Element, Text
+from Helper.traversal import walk, tree_to_list, add_parent_pointers, TreeList
+from pages import rendered_tab
+
+DEPTH = 5000
+# effects nest the blocks' display items, with clips, layers and translations that do something
+EFFECTS = ["opacity:0.5", "transform:translate(3px,4px)", "overflow:clip", "mix-blend-mode:multiply", ""]
+
+
+def recursive_walk(node, out):
+    # the recursive pre-order walk the iterative one replaced
+    out.append(node)
+    for child in node.children:
+        recursive_walk(child, out)
+    return out
+
+
+def recursive_execute(cmd, canvas):
+    # the recursive execute the enter() and leave() stack replaced
+    if isinstance(cmd, (ClipRRect, SaveLayer, Transform)):
+        cmd.enter(canvas)
+        for child in cmd.children:
+            recursive_execute(child, canvas)
+        cmd.leave(canvas)
+    else:
+        cmd.execute(canvas)
+
+
+class RecordingCanvas:
+    # the canvas calls in order, with the arguments that are plain values
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def record(*args, **kwargs):
+            values = [arg for arg in args if isinstance(arg, (int, float, str))]
+            self.calls.append((name, tuple(values)))
+        return record
+
+
+def random_tree(rng, size):
+    root = Element("html", {}, None)
+    nodes = [root]
+    for _ in range(size):
+        parent = rng.choice(nodes)
+        if rng.random() < 0.3:
+            parent.append_child(Text("t", parent))
+            continue
+        child = Element("div", {}, parent)
+        parent.append_child(child)
+        nodes.append(child)
+    return root
+
+
+def nested(open_tag, close_tag, depth):
+    return "<html><body>" + open_tag * depth + "deep" + close_tag * depth + "</body></html>"
+
+
+def full_render(html):
+    # the whole page, not only what lazy layout reaches before the first frame
+    tab = rendered_tab(html)
+    tab.document.layout_more()
+    tab.needs_paint = True
+    tab.render_paint()
+    return tab
+
+
+class WalkTest(unittest.TestCase):
+    def test_same_order_as_recursive_walk(self):
+        rng = random.Random(1)
+        for _ in range(100):
+            root = random_tree(rng, rng.randint(0, 60))
+            expected = recursive_walk(root, [])
+            self.assertEqual(list(walk(root)), expected)
+            self.assertEqual(tree_to_list(root, [1]), [1] + expected)
+
+    def test_parent_pointers(self):
+        rng = random.Random(2)
+        root = random_tree(rng, 80)
+        nodes = list(walk(root))
+        parents = [node.parent for node in nodes]
+        for node in nodes:
+            node.parent = None
+        add_parent_pointers([root])
+        self.assertEqual([node.parent for node in nodes], parents)
+
+    def test_tree_list(self):
+        rng = random.Random(3)
+        root = random_tree(rng, 20)
+        nodes = TreeList()
+        first = nodes.get(root)
+        self.assertEqual(first, list(walk(root)))
+        self.assertIs(nodes.get(root), first)
+        root.append_child(Text("new", root))
+        self.assertIs(nodes.get(root), first)
+        nodes.invalidate()
+        self.assertEqual(nodes.get(root), list(walk(root)))
+        other = random_tree(rng, 5)
+        self.assertEqual(nodes.get(other), list(walk(other)))
+
+
+class ExecuteTest(unittest.TestCase):
+    def test_same_canvas_calls_as_recursive_execute(self):
+        rng = random.Random(4)
+        for trial in range(20):
+            html = "<html><body>" + "".join(
+                "<div style={}><p>a <b style={}>b</b></p>{}</div>".format(
+                    rng.choice(EFFECTS), rng.choice(EFFECTS), "<div style=opacity:0.2>c</div>" * rng.randint(0, 2))
+                for _ in range(rng.randint(1, 6))) + "</body></html>"
+            tab = full_render(html)
+            iterative, recursive = RecordingCanvas(), RecordingCanvas()
+            for cmd in tab.display_list:
+                cmd.execute(iterative)
+                recursive_execute(cmd, recursive)
+            self.assertEqual(iterative.calls, recursive.calls, trial)
+            self.assertIn("restore", [name for name, _ in iterative.calls])
+
+
+class DeepTreeTest(unittest.TestCase):
+    def assert_renders(self, html):
+        self.assertLess(sys.getrecursionlimit(), DEPTH)
+        tab = full_render(html)
+        self.assertIsNone(tab.document.frontier)
+        # every element has a style, the innermost text is laid out, and its display items are drawn
+        self.assertGreater(len(list(walk(tab.nodes))), DEPTH)
+        self.assertTrue(all(node.style for node in walk(tab.nodes)))
+        self.assertIn("deep", [getattr(obj, "word", None) for obj in walk(tab.document)])
+        canvas = RecordingCanvas()
+        rect = skia.Rect.MakeEmpty()
+        for cmd in tab.display_list:
+            cmd.execute(canvas)
+            cmd.add_composited_bounds(rect)
+        self.assertIn("drawString", [name for name, _ in canvas.calls])
+        return tab
+
+    def test_nested_blocks(self):
+        self.assert_renders(nested("<div>", "</div>", DEPTH))
+
+    def test_nested_inline_elements(self):
+        self.assert_renders(nested("<span>", "</span>", DEPTH))
+
+    def test_nested_effects(self):
+        tab = self.assert_renders(nested("<div style=opacity:0.9>", "</div>", DEPTH))
+        # the innermost item sits below a stack of effects for each of the divs
+        depth = 0
+        cmd = tab.display_list[0]
+        while cmd.children:
+            cmd = cmd.children[-1]
+            depth += 1
+        self.assertGreater(depth, DEPTH)
+
+    def test_restyle_and_inner_html(self):
+        tab = full_render(nested("<div>", "</div>", DEPTH))
+        innermost = tab.dom_index().tag("div")[-1]
+        tab.js.style_set(tab.js.get_handle(tab.nodes.children[0]), "font-size:20px")
+        tab.js.innerHTML_set(tab.js.get_handle(innermost), "<p>new <b>text</b></p>")
+        tab.render()
+        tab.document.layout_more()
+        self.assertEqual(innermost.children[0].children[0].style["font-size"], "20px")
+        self.assertIn("new", [getattr(obj, "word", None) for obj in walk(tab.document)])
+
+
+if __name__ == "__main__":
+    unittest.main()